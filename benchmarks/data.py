@@ -0,0 +1,24 @@
+import numpy as np
+import pandas as pd
+from utils import convert_time_seconds
+
+def synthetic_ohlcv(n_bars, seed=0, timeframe='1m', start_date='2022-01-01', start_price=100.0, volatility=0.002):
+    # Seeded geometric random walk shaped like fetch_historical_data's output
+    rng = np.random.default_rng(seed)
+    close = start_price * np.exp(np.cumsum(rng.normal(0, volatility, n_bars)))
+    open_ = np.empty(n_bars)
+    open_[0] = start_price
+    open_[1:] = close[:-1]
+    wick = np.abs(rng.normal(0, volatility / 2, (2, n_bars)))
+    high = np.maximum(open_, close) * (1 + wick[0])
+    low = np.minimum(open_, close) * (1 - wick[1])
+    volume = rng.gamma(2.0, 50.0, n_bars)
+
+    return pd.DataFrame({
+        'timestamp': pd.date_range(start_date, periods=n_bars, freq=pd.Timedelta(seconds=convert_time_seconds(timeframe))),
+        'open': open_,
+        'high': high,
+        'low': low,
+        'close': close,
+        'volume': volume,
+    })
@@ -0,0 +1,221 @@
+import argparse
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+# Run from the repository root: python -m benchmarks.run --bars 10000 100000 --output bench.json
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+
+from benchmarks.data import synthetic_ohlcv
+from fake_exchange import FakeExchange
+from trading import backtest, backtest_arrays, backtest_batch, fast_backtest, fetch_historical_data
+from strategies import MovingAverageStrategy, RSIStrategy, IchimokuStrategy, ROCStrategy
+from optimization import define_search_space, optimize_strategy
+from storage import OHLCVStore
+from utils import milliseconds_to_date
+import indicators
+
+STRATEGIES = {
+    "MovingAverageStrategy": MovingAverageStrategy((11, 21, 0.02, 0.05)),
+    "RSIStrategy": RSIStrategy((14, 70, 30, 0.02, 0.05)),
+    "IchimokuStrategy": IchimokuStrategy((0.98, 1.05)),
+    "ROCStrategy": ROCStrategy((10, 1.5, 0.02, 0.05)),
+}
+STAGES = ["generate_signals", "compute_signals", "indicator_cache", "backtest", "backtest_batch", "fast_backtest", "optimize_strategy", "fetch_historical_data", "plot_candlestick_chart", "cli_backtest"]
+TAKER_FEE = 0.001
+REPOSITORY_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def best_time(function, repeat, setup=None):
+    # Minimum wall time over `repeat` runs; setup() runs untimed before each one and feeds function()
+    times = []
+    for _ in range(repeat):
+        argument = setup() if setup else None
+        start = time.perf_counter()
+        function(argument)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def cold_cache(setup):
+    # Signal stages time the indicator computation, not an indicators.default_cache hit from the previous run
+    def cold_setup():
+        indicators.default_cache.clear()
+        return setup()
+    return cold_setup
+
+def bench_strategy_stages(stages, historical_data, repeat):
+    results = []
+    for name, strategy in STRATEGIES.items():
+        signal_data = strategy.generate_signals(historical_data.copy())
+        if "generate_signals" in stages:
+            seconds = best_time(strategy.generate_signals, repeat, cold_cache(historical_data.copy))
+            results.append(("generate_signals", name, seconds))
+        if "compute_signals" in stages:
+            seconds = best_time(lambda _: strategy.compute_signals(historical_data), repeat, cold_cache(lambda: None))
+            results.append(("compute_signals", name, seconds))
+        if "backtest" in stages:
+            seconds = best_time(lambda _: backtest(name, signal_data, TAKER_FEE), repeat)
+            results.append(("backtest", name, seconds))
+        if "fast_backtest" in stages:
+            seconds = best_time(lambda _: fast_backtest(name, signal_data, TAKER_FEE, trade_history_file=None), repeat)
+            results.append(("fast_backtest", name, seconds))
+        if "optimize_strategy" in stages and name in ("MovingAverageStrategy", "ROCStrategy"):
+            seconds = best_time(lambda _: optimize_strategy(name, historical_data.copy(), TAKER_FEE, (0.02, 0.05), vectorized=True), repeat)
+            results.append(("optimize_strategy", name, seconds))
+    return results
+
+def bench_indicator_cache(historical_data, repeat):
+    # RSI(14) computed on a cold cache, and looked up again inside indicators.pinned like the sweeps do
+    close = historical_data['close']
+    compute = best_time(lambda _: indicators.rsi(close, 14), repeat, cold_cache(lambda: None))
+    with indicators.pinned(historical_data):
+        indicators.rsi(close, 14)
+        lookup = best_time(lambda _: indicators.rsi(close, 14), repeat)
+    return compute, lookup
+
+def bench_backtest_batch(historical_data, repeat, sample=24):
+    # The moving average grid scored by backtest_batch, against backtest_arrays per candidate; the per-candidate time
+    # is measured on `sample` evenly spaced columns and scaled to the whole grid
+    close, high, low = (historical_data[column].to_numpy() for column in ['close', 'high', 'low'])
+    param_grid = list(itertools.product(*define_search_space("MovingAverageStrategy")))
+    signals, stop_loss_pct, take_profit_pct = MovingAverageStrategy.generate_signal_matrix(historical_data, param_grid)
+    batch = best_time(lambda _: backtest_batch(close, high, low, signals, stop_loss_pct, take_profit_pct, TAKER_FEE), repeat)
+
+    columns = np.linspace(0, len(param_grid) - 1, min(sample, len(param_grid))).astype(int)
+    levels = [(close * stop_loss_pct[column], close * take_profit_pct[column]) for column in columns]
+
+    def per_candidate(_):
+        for column, (stop_loss, take_profit) in zip(columns, levels):
+            backtest_arrays(close, high, low, signals[:, column], stop_loss, take_profit, TAKER_FEE)
+    per_candidate_seconds = best_time(per_candidate, repeat) * len(param_grid) / len(columns)
+    return batch, per_candidate_seconds
+
+def bench_fetch(n_bars, latency, repeat):
+    exchange = FakeExchange(rateLimit=1, latency=latency)
+    start_date = '2022-01-01'
+    end_date = milliseconds_to_date(1640995200000 + n_bars * 60000)
+    return best_time(lambda _: fetch_historical_data(exchange, 'BTC/USDT', '1m', start_date, end_date), repeat)
+
+def bench_plot(historical_data, repeat):
+    from plot import plot_candlestick_chart
+    trade_report, trade_history = fast_backtest("MovingAverageStrategy", STRATEGIES["MovingAverageStrategy"].generate_signals(historical_data.copy()),
+                                                TAKER_FEE, trade_history_file=None)
+
+    def plot(_):
+        plot_candlestick_chart(historical_data, trade_history, output_file='chart.png')
+    return best_time(plot, repeat)
+
+def bench_cli(historical_data, repeat):
+    # Cold start of `cli.py backtest` in a fresh interpreter on candles cached in a local store, or None when the
+    # candles do not span a whole day (the CLI takes dates)
+    timestamps = historical_data['timestamp'].to_numpy().astype('datetime64[ms]').astype('int64')
+    end_date = milliseconds_to_date(int(timestamps[-1]) + 60000)
+    if end_date == milliseconds_to_date(int(timestamps[0])):
+        return None
+    rows = np.column_stack([timestamps] + [historical_data[column].to_numpy() for column in ['open', 'high', 'low', 'close', 'volume']])
+    OHLCVStore('cli_data').write('fake', 'BTC/USDT', '1m', rows, int(timestamps[0]), int(timestamps[-1]) + 60000)
+    config = {"exchange": "fake", "symbol": "BTC/USDT", "interval": "1m", "data_dir": "cli_data", "taker_fee": TAKER_FEE,
+              "start_date": milliseconds_to_date(int(timestamps[0])), "end_date": end_date, "trade_history_file": None}
+    with open('cli_config.json', 'w') as f:
+        json.dump(config, f)
+    command = [sys.executable, os.path.join(REPOSITORY_ROOT, 'cli.py'), 'backtest', '--config', 'cli_config.json']
+    return best_time(lambda _: subprocess.run(command, check=True, stdout=subprocess.DEVNULL), repeat)
+
+def compare(results, baseline, tolerance):
+    # Entries slower than baseline * (1 + tolerance), matched on (stage, strategy, bars)
+    expected = {(entry["stage"], entry["strategy"], entry["bars"]): entry["seconds"] for entry in baseline["results"]}
+    regressions = []
+    for entry in results:
+        key = (entry["stage"], entry["strategy"], entry["bars"])
+        if key in expected and entry["seconds"] > expected[key] * (1 + tolerance):
+            regressions.append({**entry, "baseline_seconds": expected[key]})
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the trading bot stages on synthetic candles.")
+    parser.add_argument("--bars", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.0, help="Simulated exchange latency per request in seconds")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", help="Compare against a previous --output file")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown against the baseline")
+    args = parser.parse_args(argv)
+
+    results = []
+    # Speedup of backtest_batch over scoring each candidate separately, per bar count
+    speedups = []
+    # Bar counts where a cached indicator lookup was not cheaper than computing it, which fails the run
+    slow_lookups = []
+    # Files written by the stages (charts, databases) land in a scratch working directory
+    workdir = os.getcwd()
+    with tempfile.TemporaryDirectory() as scratch:
+        os.chdir(scratch)
+        try:
+            for n_bars in args.bars:
+                historical_data = synthetic_ohlcv(n_bars, seed=args.seed)
+                timings = bench_strategy_stages(args.stages, historical_data, args.repeat)
+                if "indicator_cache" in args.stages:
+                    compute, lookup = bench_indicator_cache(historical_data, args.repeat)
+                    timings += [("indicator_cache_miss", "RSIStrategy", compute), ("indicator_cache_hit", "RSIStrategy", lookup)]
+                    if lookup >= compute:
+                        slow_lookups.append(n_bars)
+                if "backtest_batch" in args.stages:
+                    batch, per_candidate = bench_backtest_batch(historical_data, args.repeat)
+                    timings += [("backtest_batch", "MovingAverageStrategy", batch), ("backtest_per_candidate", "MovingAverageStrategy", per_candidate)]
+                    speedups.append({"stage": "backtest_batch", "strategy": "MovingAverageStrategy", "bars": n_bars, "speedup": per_candidate / batch})
+                if "fetch_historical_data" in args.stages:
+                    timings.append(("fetch_historical_data", "FakeExchange", bench_fetch(n_bars, args.latency, args.repeat)))
+                if "plot_candlestick_chart" in args.stages:
+                    timings.append(("plot_candlestick_chart", "MovingAverageStrategy", bench_plot(historical_data, args.repeat)))
+                if "cli_backtest" in args.stages:
+                    seconds = bench_cli(historical_data, args.repeat)
+                    if seconds is not None:
+                        timings.append(("cli_backtest", "MovingAverageStrategy", seconds))
+                for stage, strategy, seconds in timings:
+                    results.append({"stage": stage, "strategy": strategy, "bars": n_bars, "seconds": seconds})
+                    print(f"{stage:24} {strategy:22} {n_bars:>10} bars {seconds:10.4f} s")
+        finally:
+            os.chdir(workdir)
+
+    for entry in speedups:
+        print(f"{entry['stage']} is {entry['speedup']:.1f}x faster than scoring each candidate separately on {entry['bars']} bars")
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "latency": args.latency,
+            "created": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        },
+        "results": results,
+        "speedups": speedups,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    for n_bars in slow_lookups:
+        print(f"REGRESSION indicator_cache {n_bars} bars: a cached lookup is not cheaper than computing RSI")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for entry in regressions:
+            print(f"REGRESSION {entry['stage']} {entry['strategy']} {entry['bars']} bars: "
+                  f"{entry['seconds']:.4f} s vs {entry['baseline_seconds']:.4f} s")
+        if regressions:
+            return 1
+    return 1 if slow_lookups else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
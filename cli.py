@@ -0,0 +1,205 @@
+import argparse
+import json
+import os
+import sys
+
+# Command line entry point driven by a JSON config, e.g.
+#   python cli.py fetch --config config.json
+#   python cli.py backtest --config config.json --symbol BTCUSDT
+# Every subcommand imports only the modules it needs, so a backtest on cached candles never loads
+# ccxt, dotenv or matplotlib and starts in well under a second.
+
+DEFAULT_CONFIG = {
+    "exchange": "binance",
+    "api_key_env": "BINANCE_API_KEY",
+    "api_secret_env": "BINANCE_API_SECRET",
+    "symbol": "ETHUSDT",
+    "interval": "1h",
+    # Set (e.g. "1m") to fetch and store only this timeframe and resample every other interval from it
+    "base_interval": None,
+    "start_date": "2022-01-01",
+    "end_date": "2022-01-23",
+    "data_dir": "data",
+    # Leave out to look the fee up on the exchange, which needs a connection
+    "taker_fee": None,
+    "strategy": {"name": "MovingAverageStrategy", "params": [11, 21, 0.02, 0.05]},
+    "trade_history_file": "trade_history.csv",
+    "optimize": {"sl_tp_params": [0.03, 0.06], "n_jobs": 1, "vectorized": False, "search": "grid", "budget": None,
+                 "seed": None, "results_db": None},
+    "plot": {"output_file": "chart.png", "plot_ichimoku": False},
+    "live": {"symbols": None, "update_interval": 60, "ticks": None},
+}
+
+def load_config(path=None, overrides=None):
+    # DEFAULT_CONFIG updated with the config file, nested sections are merged key by key
+    config = json.loads(json.dumps(DEFAULT_CONFIG))
+    if path:
+        with open(path) as f:
+            for key, value in json.load(f).items():
+                if isinstance(config.get(key), dict) and isinstance(value, dict):
+                    config[key].update(value)
+                else:
+                    config[key] = value
+    config.update({key: value for key, value in (overrides or {}).items() if value is not None})
+    return config
+
+def make_exchange(config, asynchronous=False):
+    if config["exchange"] == "fake":
+        from fake_exchange import FakeExchange, AsyncFakeExchange
+        symbols = config["live"]["symbols"] or [config["symbol"]]
+        return (AsyncFakeExchange if asynchronous else FakeExchange)(symbols=symbols)
+
+    from dotenv import load_dotenv
+    if asynchronous:
+        import ccxt.async_support as ccxt
+    else:
+        import ccxt
+    load_dotenv()
+    if not hasattr(ccxt, config["exchange"]):
+        raise ValueError(f"Unknown exchange {config['exchange']}.")
+    return getattr(ccxt, config["exchange"])({
+        'apiKey': os.getenv(config["api_key_env"]),
+        'secret': os.getenv(config["api_secret_env"]),
+    })
+
+def make_strategy(spec):
+    import strategies
+    strategy_class = getattr(strategies, spec["name"], None)
+    if not (isinstance(strategy_class, type) and issubclass(strategy_class, strategies.BaseStrategy)) \
+            or strategy_class is strategies.BaseStrategy:
+        raise ValueError("Invalid strategy type. Please use a supported strategy.")
+    return strategy_class(tuple(spec["params"]))
+
+def taker_fee(config):
+    if config["taker_fee"] is not None:
+        return config["taker_fee"]
+    from trading import get_fees
+    return get_fees(make_exchange(config), config["symbol"])[0]
+
+def stored_interval(config):
+    return config["base_interval"] or config["interval"]
+
+def load_candles(config):
+    # Cached candles only, `fetch` fills the store
+    import time
+    from storage import OHLCVStore
+    from utils import convert_time_seconds, date_to_milliseconds
+    store = OHLCVStore(config["data_dir"])
+    start, end = date_to_milliseconds(config["start_date"]), date_to_milliseconds(config["end_date"])
+    # fetch never marks the still-open candle as covered, so an end date in the future only needs the closed ones
+    interval_milliseconds = convert_time_seconds(stored_interval(config)) * 1000
+    open_candle_start = int(time.time() * 1000) // interval_milliseconds * interval_milliseconds
+    missing = store.missing_ranges(config["exchange"], config["symbol"], stored_interval(config), start,
+                                   min(end, open_candle_start))
+    if missing:
+        raise SystemExit(f"{config['symbol']} {stored_interval(config)} is not cached from {config['start_date']} "
+                         f"to {config['end_date']}, run the fetch subcommand first.")
+    if stored_interval(config) != config["interval"]:
+        from resample import ResampledStore
+        return ResampledStore(store, config["base_interval"]).load(config["exchange"], config["symbol"], config["interval"], start, end)
+    return store.load(config["exchange"], config["symbol"], config["interval"], start, end)
+
+def run_backtest(config, strategy, historical_data, fee):
+    from trading import fast_backtest
+    signals = strategy.compute_signals(historical_data)
+    trade_report, trade_history = fast_backtest(strategy.__class__.__name__, historical_data, fee, signals=signals,
+                                                trade_history_file=config["trade_history_file"])
+    print("Strategy:", trade_report["strategy-name"])
+    print("Pair:", config["symbol"])
+    print("Start Time:", historical_data.iloc[0]['timestamp'])
+    print("End Time:", historical_data.iloc[-1]['timestamp'])
+    print("Final balance (USD):", trade_report["balance"])
+    print("Performance (%):", trade_report["performance"])
+    print("Just-hold Performance (%):", trade_report["just-hold-performance"])
+    print("Amount of trades", len(trade_history))
+    print("Total fees (USD)", trade_report["total_fees"])
+    return trade_report, trade_history
+
+def command_fetch(config, args):
+    from storage import OHLCVStore
+    from trading import fetch_historical_data
+    historical_data = fetch_historical_data(make_exchange(config), config["symbol"], stored_interval(config),
+                                            config["start_date"], config["end_date"], store=OHLCVStore(config["data_dir"]))
+    print("Cached", len(historical_data), "candles of", config["symbol"], stored_interval(config), "in", config["data_dir"])
+
+def command_backtest(config, args):
+    historical_data = load_candles(config)
+    run_backtest(config, make_strategy(config["strategy"]), historical_data, taker_fee(config))
+
+def command_optimize(config, args):
+    from optimization import optimize_strategy
+    historical_data = load_candles(config)
+    fee = taker_fee(config)
+    options = config["optimize"]
+    sl_tp_params = tuple(options["sl_tp_params"]) if options["sl_tp_params"] else None
+    result_store = None
+    if options["results_db"]:
+        from results import ResultStore
+        result_store = ResultStore(options["results_db"])
+    try:
+        strategy = optimize_strategy(config["strategy"]["name"], historical_data, fee, sl_tp_params,
+                                     n_jobs=options["n_jobs"], vectorized=options["vectorized"], search=options["search"],
+                                     budget=options["budget"], seed=options["seed"], result_store=result_store)
+    finally:
+        if result_store is not None:
+            result_store.close()
+    run_backtest(config, strategy, historical_data, fee)
+
+def command_plot(config, args):
+    historical_data = load_candles(config)
+    _, trade_history = run_backtest(config, make_strategy(config["strategy"]), historical_data, taker_fee(config))
+    output_file = args.output or config["plot"]["output_file"]
+    if output_file:
+        import matplotlib
+        matplotlib.use('Agg')
+    from plot import plot_candlestick_chart
+    plot_candlestick_chart(historical_data, trade_history, plot_ichimoku=config["plot"]["plot_ichimoku"],
+                           output_file=output_file)
+    if output_file:
+        print("Chart written to", output_file)
+
+def command_live(config, args):
+    from live import run_live
+    options = config["live"]
+    symbols = options["symbols"] or [config["symbol"]]
+    strategies = {symbol: make_strategy(config["strategy"]) for symbol in symbols}
+    run_live(make_exchange(config, asynchronous=True), strategies, config["interval"], ticks=options["ticks"],
+             update_interval=options["update_interval"])
+
+COMMANDS = {
+    "fetch": (command_fetch, "Download candles into the local store"),
+    "backtest": (command_backtest, "Backtest the configured strategy on cached candles"),
+    "optimize": (command_optimize, "Optimize the strategy parameters on cached candles"),
+    "plot": (command_plot, "Backtest and chart the trades"),
+    "live": (command_live, "Trade the configured symbols live"),
+}
+
+def main(argv=None):
+    # Shared options go after the subcommand so schedulers can override the config per job
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("-c", "--config", help="JSON config file, see DEFAULT_CONFIG in cli.py for the keys")
+    common.add_argument("--symbol")
+    common.add_argument("--interval")
+    common.add_argument("--start-date")
+    common.add_argument("--end-date")
+
+    parser = argparse.ArgumentParser(description="Trading bot command line.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for name, (_, help_text) in COMMANDS.items():
+        subparser = subparsers.add_parser(name, help=help_text, parents=[common])
+        if name == "plot":
+            subparser.add_argument("--output", help="PNG file to write instead of the configured one")
+    args = parser.parse_args(argv)
+
+    config = load_config(args.config, {"symbol": args.symbol, "interval": args.interval,
+                                       "start_date": args.start_date, "end_date": args.end_date})
+    COMMANDS[args.command][0](config, args)
+
+    # Stage timings when run with TRADING_BOT_INSTRUMENTATION=1, only if the command loaded the module
+    instrumentation = sys.modules.get('instrumentation')
+    if instrumentation is not None and instrumentation.enabled:
+        print(instrumentation.to_prometheus())
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,131 @@
+import asyncio
+import time
+import numpy as np
+import pandas as pd
+import ccxt
+from utils import date_to_milliseconds
+import instrumentation
+
+class TokenBucket:
+    # Shared request budget: refills `rate` tokens per second up to `capacity`. The default capacity of 1 spaces
+    # every request by 1 / rate like ccxt's rateLimit; a larger capacity lets that many go out back to back after idling.
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.waited = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens=1):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                delay = (tokens - self.tokens) / self.rate
+                self.waited += delay
+                instrumentation.count('rate_limit_wait_seconds', delay)
+                await asyncio.sleep(delay)
+
+def limiter_for(exchange):
+    # ccxt's rateLimit is the minimum delay between requests in milliseconds, concurrent pages wait their turn
+    return TokenBucket(1000 / exchange.rateLimit)
+
+def page_windows(since, end_time_milliseconds, interval_milliseconds, page_limit):
+    page_milliseconds = interval_milliseconds * page_limit
+    return [(start, min(start + page_milliseconds, end_time_milliseconds))
+            for start in range(since, end_time_milliseconds, page_milliseconds)]
+
+async def fetch_page(exchange, symbol, timeframe, start, end, limiter, retries=3, retry_delay=0.5):
+    # All candles in [start, end), following up if the exchange returns fewer rows than asked for
+    interval_milliseconds = exchange.parse_timeframe(timeframe) * 1000
+    rows = []
+
+    while start < end:
+        limit = -(-(end - start) // interval_milliseconds)
+        for attempt in range(retries + 1):
+            await limiter.acquire()
+            try:
+                ohlcv = await exchange.fetch_ohlcv(symbol, timeframe, start, limit)
+                instrumentation.count('fetch_requests')
+                break
+            except ccxt.NetworkError:
+                instrumentation.count('fetch_retries')
+                if attempt == retries:
+                    raise
+                await asyncio.sleep(retry_delay * 2 ** attempt)
+
+        if not ohlcv:
+            break
+
+        rows.extend(ohlcv)
+        instrumentation.count('fetch_rows', len(ohlcv))
+        start = int(ohlcv[-1][0]) + interval_milliseconds
+
+    return rows
+
+def assemble_pages(pages, since, end_time_milliseconds):
+    # Concatenate pages in order, keep [since, end) and drop duplicate timestamps
+    rows = [row for page in pages for row in page]
+    if not rows:
+        return []
+    timestamps = np.array([row[0] for row in rows], dtype=np.int64)
+    _, unique = np.unique(timestamps, return_index=True)
+    return [rows[i] for i in unique if since <= timestamps[i] < end_time_milliseconds]
+
+async def fetch_ohlcv_range_async(exchange, symbol, timeframe, since, end_time_milliseconds, limiter=None,
+                                  max_concurrency=8, page_limit=1000, retries=3):
+    # Async counterpart of trading.fetch_ohlcv_range: the range is split into pages that download concurrently
+    if limiter is None:
+        limiter = limiter_for(exchange)
+    interval_milliseconds = exchange.parse_timeframe(timeframe) * 1000
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def fetch_window(start, end):
+        async with semaphore:
+            return await fetch_page(exchange, symbol, timeframe, start, end, limiter, retries)
+
+    windows = page_windows(since, end_time_milliseconds, interval_milliseconds, page_limit)
+    pages = await asyncio.gather(*(fetch_window(start, end) for start, end in windows))
+    return assemble_pages(pages, since, end_time_milliseconds)
+
+async def fetch_historical_data_async(exchange, symbol, timeframe, start_date, end_date, store=None, limiter=None,
+                                      max_concurrency=8, page_limit=1000, retries=3):
+    # Same result as trading.fetch_historical_data, for a ccxt.async_support exchange
+    since = date_to_milliseconds(start_date)
+    end_time_milliseconds = date_to_milliseconds(end_date)
+    if limiter is None:
+        limiter = limiter_for(exchange)
+
+    if store is not None:
+        exchange_id = getattr(exchange, 'id', type(exchange).__name__)
+        interval_milliseconds = exchange.parse_timeframe(timeframe) * 1000
+        open_candle_start = int(time.time() * 1000) // interval_milliseconds * interval_milliseconds
+        missing = store.missing_ranges(exchange_id, symbol, timeframe, since, end_time_milliseconds)
+        results = await asyncio.gather(*(
+            fetch_ohlcv_range_async(exchange, symbol, timeframe, start, end, limiter, max_concurrency, page_limit, retries)
+            for start, end in missing))
+        for (start, end), ohlcv in zip(missing, results):
+            store.write(exchange_id, symbol, timeframe, ohlcv, start, min(end, open_candle_start))
+        return store.load(exchange_id, symbol, timeframe, since, end_time_milliseconds)
+
+    ohlcv = await fetch_ohlcv_range_async(exchange, symbol, timeframe, since, end_time_milliseconds, limiter,
+                                          max_concurrency, page_limit, retries)
+    historical_data = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+    historical_data['timestamp'] = pd.to_datetime(historical_data['timestamp'], unit='ms')
+    return historical_data
+
+async def fetch_many_async(exchange, symbols, timeframe, start_date, end_date, store=None, max_concurrency=8,
+                           page_limit=1000, retries=3):
+    # Several symbols at once under one shared rate-limit budget, returned as {symbol: DataFrame}
+    limiter = limiter_for(exchange)
+    frames = await asyncio.gather(*(
+        fetch_historical_data_async(exchange, symbol, timeframe, start_date, end_date, store, limiter,
+                                    max_concurrency, page_limit, retries)
+        for symbol in symbols))
+    return dict(zip(symbols, frames))
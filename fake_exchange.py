@@ -0,0 +1,165 @@
+import asyncio
+import time
+import numpy as np
+import ccxt
+from utils import convert_time_seconds
+
+class FakeExchange:
+    # In-process stand-in for a ccxt exchange that serves deterministic synthetic candles.
+    # The same timestamp always produces the same candle, so overlapping requests agree.
+
+    def __init__(self, id='fake', rateLimit=50, max_limit=1000, latency=0.0, failure_rate=0.0,
+                 listing_time=0, seed=0, symbols=('BTC/USDT', 'ETH/USDT'), balances=None, taker_fee=0.001,
+                 maker_fee=0.001):
+        self.id = id
+        self.rateLimit = rateLimit
+        self.max_limit = max_limit
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.listing_time = listing_time
+        self.seed = seed
+        self.requests = 0
+        self._rng = np.random.default_rng(seed)
+        self.symbols = list(symbols)
+        self.taker_fee = taker_fee
+        self.maker_fee = maker_fee
+        self.markets = None
+        self.market_loads = 0
+        # Simulated wallet and every filled order, limit orders fill immediately at their price
+        self.balances = dict(balances) if balances is not None else {'USDT': 10000.0}
+        self.orders = []
+
+    def parse_timeframe(self, timeframe):
+        return convert_time_seconds(timeframe)
+
+    def candles(self, timeframe, since, limit):
+        interval_milliseconds = self.parse_timeframe(timeframe) * 1000
+        first = max(since, self.listing_time)
+        first = -(-first // interval_milliseconds) * interval_milliseconds
+        now = int(time.time() * 1000)
+        timestamps = np.arange(first, min(first + limit * interval_milliseconds, now), interval_milliseconds, dtype=np.int64)
+
+        # Smooth trend plus hash-style noise, both pure functions of the candle index
+        index = (timestamps // interval_milliseconds).astype(np.float64)
+        noise = np.modf(np.sin(index * 12.9898 + self.seed) * 43758.5453)[0]
+        close = 100 * np.exp(0.2 * np.sin(index / 500) + 0.05 * np.sin(index / 37) + 0.01 * noise)
+        open_ = 100 * np.exp(0.2 * np.sin((index - 1) / 500) + 0.05 * np.sin((index - 1) / 37)
+                             + 0.01 * np.modf(np.sin((index - 1) * 12.9898 + self.seed) * 43758.5453)[0])
+        high = np.maximum(open_, close) * (1 + 0.004 * np.abs(noise))
+        low = np.minimum(open_, close) * (1 - 0.004 * np.abs(np.cos(index)))
+        volume = 10 + 5 * np.abs(noise)
+
+        return [[int(t), o, h, l, c, v] for t, o, h, l, c, v in
+                zip(timestamps, open_.tolist(), high.tolist(), low.tolist(), close.tolist(), volume.tolist())]
+
+    def _check_failure(self):
+        # Every request fails with a ccxt.NetworkError at failure_rate
+        self.requests += 1
+        if self.failure_rate and self._rng.random() < self.failure_rate:
+            raise ccxt.NetworkError(f"{self.id} simulated network failure")
+
+    def fetch_ohlcv(self, symbol, timeframe='1m', since=None, limit=None, params={}):
+        if self.latency:
+            time.sleep(self.latency)
+        self._check_failure()
+        limit = self.max_limit if not limit else min(limit, self.max_limit)
+        return self.candles(timeframe, since or 0, limit)
+
+    def _load_markets(self, reload=False):
+        self._check_failure()
+        if self.markets is None or reload:
+            self.market_loads += 1
+            self.markets = {}
+            for symbol in self.symbols:
+                base, quote = symbol.split('/')
+                self.markets[symbol] = {'id': base + quote, 'symbol': symbol, 'base': base, 'quote': quote,
+                                        'taker': self.taker_fee, 'maker': self.maker_fee}
+        return self.markets
+
+    def _balance(self):
+        self._check_failure()
+        return {'total': dict(self.balances), 'free': dict(self.balances)}
+
+    def _fill_order(self, symbol, type, side, amount, price, params):
+        self._check_failure()
+        market = self.market(symbol)
+        base, quote = market['base'], market['quote']
+        if price is None:
+            price = self.candles('1m', int(time.time() * 1000) - 60000, 1)[-1][4]
+        cost = amount * price
+        # Small tolerance so spending the whole balance survives float rounding of amount * price
+        if side == 'buy':
+            if cost > self.balances.get(quote, 0) * (1 + 1e-9):
+                raise ccxt.InsufficientFunds(f"{self.id} buy {symbol} needs {cost} {quote}")
+            self.balances[quote] = max(0.0, self.balances.get(quote, 0) - cost)
+            self.balances[base] = self.balances.get(base, 0) + amount * (1 - market['taker'])
+            fee = {'currency': base, 'cost': amount * market['taker']}
+        elif side == 'sell':
+            if amount > self.balances.get(base, 0) * (1 + 1e-9):
+                raise ccxt.InsufficientFunds(f"{self.id} sell {symbol} needs {amount} {base}")
+            self.balances[base] = max(0.0, self.balances.get(base, 0) - amount)
+            self.balances[quote] = self.balances.get(quote, 0) + cost * (1 - market['taker'])
+            fee = {'currency': quote, 'cost': cost * market['taker']}
+        else:
+            raise ccxt.InvalidOrder(f"{self.id} unknown order side {side}")
+        order = {'id': str(len(self.orders) + 1), 'symbol': symbol, 'type': type, 'side': side, 'amount': amount,
+                 'price': price, 'cost': cost, 'filled': amount, 'status': 'closed', 'fee': fee,
+                 'timestamp': int(time.time() * 1000), 'info': dict(params)}
+        self.orders.append(order)
+        return order
+
+    def market(self, symbol):
+        if self.markets is None:
+            raise ccxt.ExchangeError(f"{self.id} markets not loaded")
+        if symbol not in self.markets:
+            raise ccxt.BadSymbol(f"{self.id} does not have market symbol {symbol}")
+        return self.markets[symbol]
+
+    def load_markets(self, reload=False):
+        if self.latency:
+            time.sleep(self.latency)
+        self._check_failure()
+        return self._load_markets(reload)
+
+    def fetch_balance(self):
+        if self.latency:
+            time.sleep(self.latency)
+        self._check_failure()
+        return self._balance()
+
+    def create_order(self, symbol, type, side, amount, price=None, params={}):
+        if self.latency:
+            time.sleep(self.latency)
+        self._check_failure()
+        return self._fill_order(symbol, type, side, amount, price, params)
+
+class AsyncFakeExchange(FakeExchange):
+    # Same candles as FakeExchange behind ccxt.async_support-style coroutines
+
+    async def fetch_ohlcv(self, symbol, timeframe='1m', since=None, limit=None, params={}):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self._check_failure()
+        limit = self.max_limit if not limit else min(limit, self.max_limit)
+        return self.candles(timeframe, since or 0, limit)
+
+    async def load_markets(self, reload=False):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self._check_failure()
+        return self._load_markets(reload)
+
+    async def fetch_balance(self):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self._check_failure()
+        return self._balance()
+
+    async def create_order(self, symbol, type, side, amount, price=None, params={}):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self._check_failure()
+        return self._fill_order(symbol, type, side, amount, price, params)
+
+    async def close(self):
+        pass
@@ -0,0 +1,144 @@
+from collections import deque
+import math
+
+class RingBuffer:
+    # Fixed-size buffer of the latest `capacity` values, oldest first when indexed
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._values = [None] * capacity
+        self._start = 0
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def full(self):
+        return self._size == self.capacity
+
+    def append(self, value):
+        # Returns the value pushed out of the buffer, or None while it is still filling
+        end = (self._start + self._size) % self.capacity
+        evicted = self._values[end] if self._size == self.capacity else None
+        self._values[end] = value
+        if self._size == self.capacity:
+            self._start = (self._start + 1) % self.capacity
+        else:
+            self._size += 1
+        return evicted
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("RingBuffer index out of range")
+        return self._values[(self._start + index) % self.capacity]
+
+    def to_list(self):
+        return [self[i] for i in range(self._size)]
+
+class RollingMean:
+    # O(1) simple moving average, NaN until `window` values have been seen.
+    # Mirrors pandas' rolling().mean(): compensated running sums with separate add/remove
+    # compensation terms, and an exact result while the window holds one repeated value.
+
+    def __init__(self, window):
+        self.window = window
+        self._buffer = RingBuffer(window)
+        self._sum = 0.0
+        self._add_compensation = 0.0
+        self._remove_compensation = 0.0
+        self._previous = None
+        self._same_count = 0
+        self.value = math.nan
+
+    def update(self, value):
+        evicted = self._buffer.append(value)
+        if evicted is not None:
+            y = -evicted - self._remove_compensation
+            t = self._sum + y
+            self._remove_compensation = t - self._sum - y
+            self._sum = t
+
+        y = value - self._add_compensation
+        t = self._sum + y
+        self._add_compensation = t - self._sum - y
+        self._sum = t
+        self._same_count = self._same_count + 1 if value == self._previous else 1
+        self._previous = value
+
+        if not self._buffer.full():
+            self.value = math.nan
+        elif self._same_count >= self.window:
+            self.value = value
+        else:
+            self.value = self._sum / self.window
+        return self.value
+
+class WilderRSI:
+    # Wilder-smoothed RSI with the same seeding and update order as talib.RSI
+
+    def __init__(self, period):
+        self.period = period
+        self._previous = None
+        self._count = 0
+        self._gain = 0.0
+        self._loss = 0.0
+        self.value = math.nan
+
+    def update(self, value):
+        if self._previous is None:
+            self._previous = value
+            return self.value
+
+        change = value - self._previous
+        self._previous = value
+        self._count += 1
+
+        if self._count <= self.period:
+            # Seed with the plain average of the first `period` changes
+            if change < 0:
+                self._loss -= change
+            else:
+                self._gain += change
+            if self._count < self.period:
+                return self.value
+            self._loss /= self.period
+            self._gain /= self.period
+        else:
+            self._loss *= (self.period - 1)
+            self._gain *= (self.period - 1)
+            if change < 0:
+                self._loss -= change
+            else:
+                self._gain += change
+            self._loss /= self.period
+            self._gain /= self.period
+
+        total = self._gain + self._loss
+        self.value = 100.0 * (self._gain / total) if not -1e-8 < total < 1e-8 else 0.0
+        return self.value
+
+class RollingExtreme:
+    # O(1) amortised rolling max (or min) over a monotonic deque of (index, value) pairs
+
+    def __init__(self, window, mode='max'):
+        self.window = window
+        self._is_max = mode == 'max'
+        self._deque = deque()
+        self._index = -1
+        self.value = math.nan
+
+    def update(self, value):
+        self._index += 1
+        if self._is_max:
+            while self._deque and self._deque[-1][1] <= value:
+                self._deque.pop()
+        else:
+            while self._deque and self._deque[-1][1] >= value:
+                self._deque.pop()
+        self._deque.append((self._index, value))
+        if self._deque[0][0] <= self._index - self.window:
+            self._deque.popleft()
+        self.value = self._deque[0][1] if self._index >= self.window - 1 else math.nan
+        return self.value
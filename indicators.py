@@ -0,0 +1,120 @@
+import hashlib
+from collections import OrderedDict
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+import talib
+import instrumentation
+
+# Memoized indicator layer shared by the strategies and trading.ichimoku_cloud. Results are cached as
+# read-only arrays keyed by (fingerprint of the input values, indicator name, params) and returned as
+# Series on the caller's index, so the same SMA(21) or RSI(14) is computed once per dataset.
+# Hashing an input costs about as much as computing a cheap indicator, so loops over one dataset (sweeps,
+# walk-forward, portfolios) run inside pinned(data), which hashes its columns once for every lookup in the block.
+
+class IndicatorCache:
+    # LRU bounded both by entry count and by the bytes of the cached arrays
+
+    def __init__(self, max_entries=512, max_bytes=512 * 2**20):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_compute(self, key, compute):
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            instrumentation.count('indicator_cache_hits')
+            return entry
+
+        self.misses += 1
+        instrumentation.count('indicator_cache_misses')
+        values = tuple(np.array(value, dtype=np.float64) for value in compute())
+        for value in values:
+            value.flags.writeable = False
+        size = sum(value.nbytes for value in values)
+        if size <= self.max_bytes:
+            self._entries[key] = values
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= sum(value.nbytes for value in evicted)
+                self.evictions += 1
+        return values
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+        }
+
+default_cache = IndicatorCache()
+
+# Digests of the columns pinned by pinned(), keyed by their buffer
+_pinned = {}
+
+def fingerprint(values):
+    # Digest of every value: any in-place edit of a frame changes it, so a cached result is never stale
+    return hashlib.sha1(np.ascontiguousarray(values, dtype=np.float64)).hexdigest()
+
+def _buffer_key(values):
+    interface = values.__array_interface__
+    return interface['data'][0], values.shape, interface['strides'], values.dtype.str
+
+def _input_fingerprint(values):
+    digest = _pinned.get(_buffer_key(values))
+    return digest if digest is not None else fingerprint(values)
+
+@contextmanager
+def pinned(data, columns=('open', 'high', 'low', 'close', 'volume')):
+    # Fingerprint the float64 columns of data once for every indicator lookup inside the block, the columns (and
+    # any Series sharing their buffers) are then looked up without hashing. data must not be edited in place inside.
+    added = []
+    for column in columns:
+        if column not in data:
+            continue
+        values = data[column].to_numpy()
+        key = _buffer_key(values)
+        if values.dtype == np.float64 and key not in _pinned:
+            _pinned[key] = fingerprint(values)
+            added.append(key)
+    try:
+        yield data
+    finally:
+        for key in added:
+            _pinned.pop(key, None)
+
+def _cached(name, params, inputs, compute, cache):
+    cache = default_cache if cache is None else cache
+    key = (tuple(_input_fingerprint(series.to_numpy()) for series in inputs), name, params)
+    values = cache.get_or_compute(key, compute)
+    return tuple(pd.Series(value, index=inputs[0].index, copy=False) for value in values)
+
+def sma(close, window, cache=None):
+    return _cached('sma', (window,), (close,), lambda: (close.rolling(window=window).mean().to_numpy(),), cache)[0]
+
+def rsi(close, period, cache=None):
+    return _cached('rsi', (period,), (close,), lambda: (talib.RSI(close.to_numpy(dtype=np.float64), timeperiod=period),), cache)[0]
+
+def roc(close, period, cache=None):
+    return _cached('roc', (period,), (close,), lambda: ((close.pct_change(periods=period) * 100).to_numpy(),), cache)[0]
+
+def rolling_max(values, window, cache=None):
+    return _cached('rolling_max', (window,), (values,), lambda: (values.rolling(window=window).max().to_numpy(),), cache)[0]
+
+def rolling_min(values, window, cache=None):
+    return _cached('rolling_min', (window,), (values,), lambda: (values.rolling(window=window).min().to_numpy(),), cache)[0]
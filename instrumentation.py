@@ -0,0 +1,133 @@
+import os
+import time
+import functools
+from collections import defaultdict
+
+# Off by default: timed() hands out a shared no-op context manager and the other hooks return
+# straight away. Turn on with enable() or TRADING_BOT_INSTRUMENTATION=1. Metrics are per process,
+# so work done inside process pools is not included.
+enabled = os.getenv('TRADING_BOT_INSTRUMENTATION', '') not in ('', '0')
+
+# Upper bounds in seconds for latency histograms, Prometheus-style with an implicit +Inf
+LATENCY_BUCKETS = (1e-6, 5e-6, 1e-5, 5e-5, 1e-4, 5e-4, 1e-3, 5e-3, 1e-2, 5e-2, 0.1, 0.5, 1.0, 5.0)
+
+_stages = defaultdict(lambda: {"calls": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0, "max_wall_seconds": 0.0})
+_counters = defaultdict(float)
+_gauges = {}
+_histograms = {}
+
+class _NullTimer:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+class _StageTimer:
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self._wall
+        stats = _stages[self.stage]
+        stats["calls"] += 1
+        stats["wall_seconds"] += wall
+        stats["cpu_seconds"] += time.process_time() - self._cpu
+        stats["max_wall_seconds"] = max(stats["max_wall_seconds"], wall)
+        return False
+
+def enable():
+    global enabled
+    enabled = True
+
+def disable():
+    global enabled
+    enabled = False
+
+def reset():
+    _stages.clear()
+    _counters.clear()
+    _gauges.clear()
+    _histograms.clear()
+
+def timed(stage):
+    # with timed('backtest'): ... records wall and CPU time for the stage
+    return _StageTimer(stage) if enabled else _NULL_TIMER
+
+def instrumented(stage):
+    # Decorator form of timed(); when disabled the wrapper only adds one flag check
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return function(*args, **kwargs)
+            with _StageTimer(stage):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def count(name, value=1):
+    if enabled:
+        _counters[name] += value
+
+def gauge(name, value):
+    if enabled:
+        _gauges[name] = value
+
+def observe(name, value, buckets=LATENCY_BUCKETS):
+    if not enabled:
+        return
+    histogram = _histograms.get(name)
+    if histogram is None:
+        histogram = _histograms[name] = {"buckets": buckets, "counts": [0] * (len(buckets) + 1), "sum": 0.0, "count": 0}
+    for index, bound in enumerate(histogram["buckets"]):
+        if value <= bound:
+            break
+    else:
+        index = len(histogram["buckets"])
+    histogram["counts"][index] += 1
+    histogram["sum"] += value
+    histogram["count"] += 1
+
+def report():
+    # Snapshot of everything recorded so far as plain dicts
+    return {
+        "stages": {stage: dict(stats) for stage, stats in _stages.items()},
+        "counters": dict(_counters),
+        "gauges": dict(_gauges),
+        "histograms": {name: {"buckets": list(h["buckets"]), "counts": list(h["counts"]), "sum": h["sum"], "count": h["count"]}
+                       for name, h in _histograms.items()},
+    }
+
+def to_prometheus(prefix='trading_bot'):
+    # The same snapshot in the Prometheus text exposition format
+    lines = []
+    if _stages:
+        for metric, key, kind in (("stage_calls_total", "calls", "counter"), ("stage_wall_seconds_total", "wall_seconds", "counter"),
+                                  ("stage_cpu_seconds_total", "cpu_seconds", "counter"), ("stage_max_wall_seconds", "max_wall_seconds", "gauge")):
+            lines.append(f"# TYPE {prefix}_{metric} {kind}")
+            lines.extend(f'{prefix}_{metric}{{stage="{stage}"}} {stats[key]}' for stage, stats in sorted(_stages.items()))
+    for name, value in sorted(_counters.items()):
+        lines.append(f"# TYPE {prefix}_{name}_total counter")
+        lines.append(f"{prefix}_{name}_total {value}")
+    for name, value in sorted(_gauges.items()):
+        lines.append(f"# TYPE {prefix}_{name} gauge")
+        lines.append(f"{prefix}_{name} {value}")
+    for name, histogram in sorted(_histograms.items()):
+        lines.append(f"# TYPE {prefix}_{name} histogram")
+        cumulative = 0
+        for bound, bucket_count in zip(list(histogram["buckets"]) + ["+Inf"], histogram["counts"]):
+            cumulative += bucket_count
+            lines.append(f'{prefix}_{name}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f"{prefix}_{name}_sum {histogram['sum']}")
+        lines.append(f"{prefix}_{name}_count {histogram['count']}")
+    return "\n".join(lines) + "\n"
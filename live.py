@@ -0,0 +1,242 @@
+import asyncio
+import time
+import ccxt
+import instrumentation
+from downloader import fetch_ohlcv_range_async, limiter_for
+
+OHLCV_FIELDS = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+
+class TTLCache:
+    # Values expire ttl seconds after they were fetched, concurrent misses on a key share a single fetch
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._values = {}
+        self._locks = {}
+
+    def _fresh(self, key):
+        entry = self._values.get(key)
+        return entry is not None and time.monotonic() - entry[0] < self.ttl
+
+    async def get(self, key, fetch):
+        if self._fresh(key):
+            return self._values[key][1]
+        async with self._locks.setdefault(key, asyncio.Lock()):
+            if not self._fresh(key):
+                instrumentation.count('live_cache_misses')
+                self._values[key] = (time.monotonic(), await fetch())
+            return self._values[key][1]
+
+    def invalidate(self, key=None):
+        if key is None:
+            self._values.clear()
+        else:
+            self._values.pop(key, None)
+
+def split_symbol(symbol):
+    if '/' in symbol:
+        return tuple(symbol.split('/'))
+    return symbol[:3], symbol[3:]
+
+class LiveEngine:
+    # Event-driven counterpart of trading.run_trading_bot for many symbols on one asyncio loop.
+    # exchange is a ccxt.async_support exchange or fake_exchange.AsyncFakeExchange, strategies maps symbol -> strategy.
+    # Market metadata comes from a TTL cache and balances are refreshed in the background, so a signal only waits
+    # for its order round trip; the orders of one tick are sent concurrently. Network errors are retried, a symbol
+    # whose poll still fails is skipped for that tick and picks its missed bars up on the next one.
+
+    def __init__(self, exchange, strategies, interval, update_interval=60, market_ttl=3600, balance_interval=30,
+                 max_concurrency=8, retries=3, retry_delay=0.5):
+        self.exchange = exchange
+        self.strategies = dict(strategies)
+        self.interval = interval
+        self.interval_milliseconds = exchange.parse_timeframe(interval) * 1000
+        self.update_interval = update_interval
+        self.balance_interval = balance_interval
+        self.max_concurrency = max_concurrency
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.metadata = TTLCache(market_ttl)
+        self.limiter = limiter_for(exchange)
+        self.balances = {}
+        self.last_timestamps = {}
+        self.orders = []
+
+    async def _retry(self, request):
+        # await request() again after a ccxt.NetworkError with exponential backoff, like downloader.fetch_page
+        for attempt in range(self.retries + 1):
+            try:
+                return await request()
+            except ccxt.NetworkError:
+                instrumentation.count('live_retries')
+                if attempt == self.retries:
+                    raise
+                await asyncio.sleep(self.retry_delay * 2 ** attempt)
+
+    async def markets(self):
+        # One load_markets per TTL for all symbols, reload=True because the cache decides when to refresh
+        return await self.metadata.get('markets', lambda: self._retry(lambda: self.exchange.load_markets(True)))
+
+    async def market(self, symbol):
+        markets = await self.markets()
+        if symbol not in markets:
+            raise ValueError(f"{symbol} is not a market of {self.exchange.id}.")
+        return markets[symbol]
+
+    async def fees(self, symbol):
+        market = await self.market(symbol)
+        return market['taker'], market['maker']
+
+    async def refresh_balances(self):
+        balance = await self.exchange.fetch_balance()
+        self.balances = dict(balance['total'])
+        return self.balances
+
+    async def _refresh_balances_forever(self):
+        while True:
+            await asyncio.sleep(self.balance_interval)
+            try:
+                await self.refresh_balances()
+            except ccxt.NetworkError as error:
+                instrumentation.count('live_balance_errors')
+                print("Balance refresh failed:", error)
+
+    async def warmup(self, symbol):
+        # Same warm-up as run_trading_bot: just enough closed bars for the strategy's incremental state
+        strategy = self.strategies[symbol]
+        now = int(time.time() * 1000)
+        last_closed = now // self.interval_milliseconds * self.interval_milliseconds - self.interval_milliseconds
+        since = last_closed - (strategy.warmup_period - 1) * self.interval_milliseconds
+        strategy.reset()
+        self.last_timestamps[symbol] = since - self.interval_milliseconds
+        rows = await fetch_ohlcv_range_async(self.exchange, symbol, self.interval, since,
+                                             last_closed + self.interval_milliseconds, limiter=self.limiter,
+                                             max_concurrency=self.max_concurrency, retries=self.retries)
+        for row in rows:
+            strategy.update(dict(zip(OHLCV_FIELDS, row)))
+            self.last_timestamps[symbol] = int(row[0])
+
+    async def poll(self, symbol):
+        # Feed the newly closed bars of symbol to its strategy, returns (signal, close) or None without new bars
+        async def fetch():
+            await self.limiter.acquire()
+            return await self.exchange.fetch_ohlcv(symbol, self.interval, self.last_timestamps[symbol] + self.interval_milliseconds)
+
+        now = int(time.time() * 1000)
+        with instrumentation.timed('live_fetch'):
+            candles = await self._retry(fetch)
+        closed = [row for row in candles if row[0] + self.interval_milliseconds <= now]
+        if not closed:
+            return None
+        strategy = self.strategies[symbol]
+        for row in closed:
+            latest_signal = strategy.update(dict(zip(OHLCV_FIELDS, row)))
+            self.last_timestamps[symbol] = int(row[0])
+        return latest_signal, closed[-1][4]
+
+    def plan_orders(self, signals):
+        # (symbol, side, amount, price) from the cached balances. Buys sharing a quote currency split it evenly,
+        # and the planned amounts are reserved so the next tick does not spend them again before a refresh.
+        buyers = {}
+        for symbol, (signal, price) in signals.items():
+            if signal == 1:
+                buyers.setdefault(split_symbol(symbol)[1], []).append(symbol)
+
+        orders = []
+        for symbol, (signal, price) in signals.items():
+            base_currency, quote_currency = split_symbol(symbol)
+            if signal == 1:
+                print(symbol, "buy signal detected")
+                quote_currency_balance = float(self.balances.get(quote_currency, 0)) / len(buyers[quote_currency])
+                if quote_currency_balance > 0:
+                    orders.append((symbol, 'buy', quote_currency_balance / price, price))
+            elif signal == -1:
+                print(symbol, "sell signal detected")
+                base_currency_balance = float(self.balances.get(base_currency, 0))
+                if base_currency_balance > 0:
+                    orders.append((symbol, 'sell', base_currency_balance, price))
+
+        for order in orders:
+            self._reserve(order, 1)
+        return orders
+
+    def _reserve(self, order, sign):
+        # Take the amount an order spends out of the cached balances (sign=1) or give it back (sign=-1)
+        symbol, side, amount, price = order
+        base_currency, quote_currency = split_symbol(symbol)
+        currency, spent = (quote_currency, amount * price) if side == 'buy' else (base_currency, amount)
+        self.balances[currency] = max(0.0, float(self.balances.get(currency, 0)) - sign * spent)
+
+    async def send_order(self, symbol, side, amount, price):
+        taker_fee, _ = await self.fees(symbol)
+        # Same order as trading.execute_trade
+        order = await self.exchange.create_order(symbol, 'limit', side, amount, price, {'test': True})
+        self.orders.append({'symbol': symbol, 'side': side, 'amount': amount, 'price': price,
+                            'expected_fee': amount * price * taker_fee, 'order': order})
+        print(f"Executed {side} order for {symbol}")
+        return order
+
+    async def tick(self):
+        symbols = list(self.strategies)
+        polled = await asyncio.gather(*(self.poll(symbol) for symbol in symbols), return_exceptions=True)
+        decision_start = time.perf_counter()
+        signals = {}
+        for symbol, result in zip(symbols, polled):
+            if isinstance(result, ccxt.NetworkError):
+                instrumentation.count('live_poll_errors')
+                print(f"Polling {symbol} failed, skipped this tick:", result)
+            elif isinstance(result, BaseException):
+                raise result
+            elif result is not None:
+                signals[symbol] = result
+        orders = self.plan_orders(signals)
+        if not orders:
+            return []
+
+        results = await asyncio.gather(*(self.send_order(*order) for order in orders), return_exceptions=True)
+        instrumentation.observe('live_signal_to_order_seconds', time.perf_counter() - decision_start)
+        for order, result in zip(orders, results):
+            if isinstance(result, Exception):
+                instrumentation.count('live_order_errors')
+                print(f"{order[1].capitalize()} order for {order[0]} failed:", result)
+                self._reserve(order, -1)
+        try:
+            await self.refresh_balances()
+        except ccxt.NetworkError as error:
+            # plan_orders already reserved the spent amounts, the background refresh catches up
+            instrumentation.count('live_balance_errors')
+            print("Balance refresh failed:", error)
+        return results
+
+    async def run(self, ticks=None):
+        # Runs forever unless ticks limits the number of update rounds
+        await self.markets()
+        for symbol in self.strategies:
+            await self.market(symbol)
+        await asyncio.gather(self._retry(self.refresh_balances), *(self.warmup(symbol) for symbol in self.strategies))
+
+        balance_task = asyncio.create_task(self._refresh_balances_forever())
+        try:
+            done = 0
+            while ticks is None or done < ticks:
+                with instrumentation.timed('live_sleep'):
+                    await asyncio.sleep(self.update_interval)
+                await self.tick()
+                done += 1
+        finally:
+            balance_task.cancel()
+            try:
+                await balance_task
+            except asyncio.CancelledError:
+                pass
+
+def run_live(exchange, strategies, interval, ticks=None, **options):
+    # Blocking entry point, closes the exchange session when the engine stops
+    async def main():
+        engine = LiveEngine(exchange, strategies, interval, **options)
+        try:
+            await engine.run(ticks)
+        finally:
+            await exchange.close()
+        return engine
+    return asyncio.run(main())
@@ -2,10 +2,13 @@ import os
 import numpy as np
 import pandas as pd
 import ccxt
-from trading import fetch_historical_data, backtest, get_fees
+from trading import fetch_historical_data, fast_backtest, get_fees
 from plot import plot_candlestick_chart
 from strategies import MovingAverageStrategy, ROCStrategy
 from optimization import optimize_strategy
+from storage import OHLCVStore
+from robustness import robustness_report
+import instrumentation
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -24,18 +27,15 @@ end_date = '2022-01-23'
 
 taker_fee, maker_fee = get_fees(binance, symbol)
 
-# Fetch historical data
-historical_data = fetch_historical_data(binance, symbol, interval, start_date, end_date)
-
-df = pd.DataFrame(historical_data)
-df.to_csv('historical_data.csv')
+# Fetch historical data, reusing candles cached under data/ from previous runs
+store = OHLCVStore('data')
+historical_data = fetch_historical_data(binance, symbol, interval, start_date, end_date, store=store)
 
 # Do you want to optimize your strategy parameters? It might take longer
 optimize_parameters = False
 
 # Choose the strategy you want to use
 strategy = MovingAverageStrategy((11, 21, 0.02, 0.05))
-# signal_data = strategy.generate_signals(historical_data)
 
 if optimize_parameters:
     # Run the optimization process
@@ -44,16 +44,17 @@ if optimize_parameters:
     print("-----------------------")
     optimized_strategy = optimize_strategy(strategy.__class__.__name__, historical_data, taker_fee, sl_tp_params=(0.03, 0.06))
     # Use the strategy with best parameters to generate signals
-    signal_data = optimized_strategy.generate_signals(historical_data.copy())
+    signals = optimized_strategy.compute_signals(historical_data)
 else:
     # Run the backtest without optimization
-    signal_data = strategy.generate_signals(historical_data.copy())
+    signals = strategy.compute_signals(historical_data)
 
 # Run backtesting and print results
 print("-----------------------")
 print("Running Final Backtest")
 print("-----------------------")
-trade_report, trade_history = backtest(strategy.__class__.__name__, signal_data, taker_fee)
+trade_report, trade_history = fast_backtest(strategy.__class__.__name__, historical_data, taker_fee, signals=signals,
+                                            trade_history_file='trade_history.csv')
 print("Strategy:", trade_report["strategy-name"])
 print("Pair:", symbol)
 print("Start Time:", historical_data.iloc[0]['timestamp'])
@@ -64,4 +65,14 @@ print("Just-hold Performance (%):", trade_report["just-hold-performance"])
 print("Amount of trades", len(trade_history))
 print("Total fees (USD)", trade_report["total_fees"])
 
+# How fragile the result is: bootstrap the round-trip returns of the trades
+robustness = robustness_report(trade_history, taker_fee, final_price=historical_data.iloc[-1]['close'])
+print("Bootstrap final balance 5%/50%/95% (USD):", robustness["final-balance-p5"], robustness["final-balance-p50"], robustness["final-balance-p95"])
+print("Bootstrap max drawdown median (%):", robustness["max-drawdown-p50"])
+print("Ruin probability:", robustness["ruin-probability"])
+
 plot_candlestick_chart(historical_data, trade_history, plot_ichimoku=False)
+
+# Stage timings when run with TRADING_BOT_INSTRUMENTATION=1
+if instrumentation.enabled:
+    print(instrumentation.to_prometheus())
@@ -1,7 +1,29 @@
+import os
+import time
 import numpy as np
+import pandas as pd
 import itertools
-from trading import backtest
-from strategies import MovingAverageStrategy, ROCStrategy
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from trading import backtest_arrays, backtest_batch
+from strategies import MovingAverageStrategy, RSIStrategy, ROCStrategy
+from search import SEARCH_MODES, grid_size
+import instrumentation
+import indicators
+from results import data_key
+
+OHLCV_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+STRATEGY_CLASSES = {
+    "MovingAverageStrategy": MovingAverageStrategy,
+    "ROCStrategy": ROCStrategy,
+}
+
+# Columns per signal matrix in vectorized sweeps, keeps n_bars x chunk_size int8 matrices bounded
+VECTORIZED_CHUNK_SIZE = 256
+
+# Per-process views of the shared OHLCV blocks, attached on first use and kept for the life of the worker
+_worker_blocks = {}
 
 def define_search_space(strategy_class):
     if strategy_class == "MovingAverageStrategy":
@@ -14,36 +36,211 @@ def define_search_space(strategy_class):
             range(5, 21),  # ROC periods from 5 to 20
             [x / 10.0 for x in range(10, 31)]  # ROC thresholds from 1.0 to 3.0 in increments of 0.1
         ]
+    elif strategy_class == "RSIStrategy":
+        # Longer periods and thresholds further out rarely reach oversold and never trade
+        search_space = [
+            range(5, 21),  # RSI periods from 5 to 20
+            range(60, 81, 2),  # Overbought thresholds from 60 to 80
+            range(20, 41, 2),  # Oversold thresholds from 20 to 40
+            [x / 1000.0 for x in range(10, 51, 5)],  # Stop-loss from 1% to 5%
+            [x / 100.0 for x in range(2, 11)]  # Take-profit from 2% to 10%
+        ]
     else:
         raise ValueError("Invalid strategy type. Please use a supported strategy.")
     return search_space
 
-def optimize_strategy(strategy_class, historical_data, taker_fee, sl_tp_params=None):
+def build_strategy(strategy_class, params, sl_tp_params=None):
+    if strategy_class == "MovingAverageStrategy":
+        if sl_tp_params:
+            return MovingAverageStrategy(params + sl_tp_params)
+        raise ValueError("Please provide stop_loss and take_profit parameters for MovingAverageStrategy.")
+    elif strategy_class == "ROCStrategy":
+        return ROCStrategy(params + sl_tp_params if sl_tp_params else params)
+    elif strategy_class == "RSIStrategy":
+        # Stop-loss and take-profit are part of the RSI search space
+        return RSIStrategy(params)
+    raise ValueError("Invalid strategy type. Please use a supported strategy.")
+
+def share_arrays(arrays):
+    # Copy equally sized float64 arrays into one shared memory block, one row per array
+    block = np.vstack([np.asarray(array, dtype=np.float64) for array in arrays])
+    shm = shared_memory.SharedMemory(create=True, size=max(block.nbytes, 1))
+    shared = np.ndarray(block.shape, dtype=np.float64, buffer=shm.buf)
+    shared[:] = block
+    return shm, block.shape
+
+def attach_arrays(shm_name, shape):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    return shm, np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+
+def _worker_frame(shm_name, shape):
+    if shm_name not in _worker_blocks:
+        shm, block = attach_arrays(shm_name, shape)
+        _worker_blocks[shm_name] = (shm, pd.DataFrame(dict(zip(OHLCV_COLUMNS, block)), copy=False))
+    return _worker_blocks[shm_name][1]
+
+def evaluate_params(strategy_class, param_chunk, historical_data, taker_fee, sl_tp_params=None, vectorized=False):
+    # Final balance of every params tuple in the chunk, without writing any trade history
+    close = historical_data['close'].to_numpy()
+    high = historical_data['high'].to_numpy()
+    low = historical_data['low'].to_numpy()
+
+    if vectorized:
+        param_grid = [build_strategy(strategy_class, params, sl_tp_params).params for params in param_chunk]
+        signals, stop_loss_pct, take_profit_pct = STRATEGY_CLASSES[strategy_class].generate_signal_matrix(historical_data, param_grid)
+        balances, _ = backtest_batch(close, high, low, signals, stop_loss_pct, take_profit_pct, taker_fee)
+        return balances.tolist()
+
+    balances = []
+    with indicators.pinned(historical_data):
+        for params in param_chunk:
+            # float64 stop levels keep the balances identical to backtest() on generate_signals output
+            signals = build_strategy(strategy_class, params, sl_tp_params).compute_signals(historical_data, dtype=np.float64)
+            balance, _, _ = backtest_arrays(close, high, low, signals.signal, signals.stop_loss, signals.take_profit, taker_fee)
+            balances.append(balance)
+    return balances
+
+def _evaluate_chunk(shm_name, shape, strategy_class, chunk, sl_tp_params, taker_fee, vectorized):
+    return evaluate_params(strategy_class, chunk, _worker_frame(shm_name, shape), taker_fee, sl_tp_params, vectorized)
+
+def _chunk(param_combinations, chunk_size):
+    return [param_combinations[i:i + chunk_size] for i in range(0, len(param_combinations), chunk_size)]
+
+class ParallelScorer:
+    # Process pool and shared OHLCV blocks kept for a whole optimize_strategy call, so searches that score many
+    # small batches (TPE, successive halving, ResultStore batches) do not start a pool per batch.
+    # Every distinct DataFrame is copied to shared memory once, workers attach to it on first use.
+
+    def __init__(self, n_jobs):
+        self.n_jobs = n_jobs
+        self.executor = ProcessPoolExecutor(max_workers=n_jobs)
+        # id(historical_data) -> (historical_data, shm, shape), the frame is kept so its id is not reused
+        self._blocks = {}
+
+    def share(self, historical_data):
+        entry = self._blocks.get(id(historical_data))
+        if entry is None:
+            shm, shape = share_arrays([historical_data[column].to_numpy() for column in OHLCV_COLUMNS])
+            entry = self._blocks[id(historical_data)] = (historical_data, shm, shape)
+        return entry[1].name, entry[2]
+
+    def score(self, strategy_class, candidates, historical_data, taker_fee, sl_tp_params=None, chunk_size=None,
+              vectorized=False):
+        if chunk_size is None:
+            chunk_size = max(1, -(-len(candidates) // (self.n_jobs * 4)))
+            if vectorized:
+                chunk_size = min(chunk_size, VECTORIZED_CHUNK_SIZE)
+        shm_name, shape = self.share(historical_data)
+        futures = [self.executor.submit(_evaluate_chunk, shm_name, shape, strategy_class, chunk, sl_tp_params, taker_fee,
+                                        vectorized)
+                   for chunk in _chunk(candidates, chunk_size)]
+        return [balance for future in futures for balance in future.result()]
+
+    def close(self):
+        # Workers exit before the blocks they map are unlinked
+        self.executor.shutdown()
+        for _, shm, _ in self._blocks.values():
+            shm.close()
+            shm.unlink()
+        self._blocks.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def score_candidates(strategy_class, candidates, historical_data, taker_fee, sl_tp_params=None, n_jobs=1,
+                     chunk_size=None, vectorized=False, scorer=None):
+    # Final balance of every candidate, through a process pool when n_jobs > 1 (scorer's if given, else a pool for
+    # this call). A single candidate is always scored in-process, shipping it to a worker costs more than it saves.
+    if n_jobs > 1 and len(candidates) > 1:
+        if scorer is not None:
+            return scorer.score(strategy_class, candidates, historical_data, taker_fee, sl_tp_params, chunk_size, vectorized)
+        with ParallelScorer(n_jobs) as scorer:
+            return scorer.score(strategy_class, candidates, historical_data, taker_fee, sl_tp_params, chunk_size, vectorized)
+    balances = []
+    for chunk in _chunk(candidates, chunk_size or VECTORIZED_CHUNK_SIZE):
+        balances.extend(evaluate_params(strategy_class, chunk, historical_data, taker_fee, sl_tp_params, vectorized))
+    return balances
+
+def score_with_store(strategy_class, candidates, historical_data, taker_fee, result_store, sl_tp_params=None, n_jobs=1,
+                     chunk_size=None, vectorized=False, scorer=None):
+    # score_candidates that skips candidates already in the ResultStore and saves new results batch by batch,
+    # so an interrupted sweep loses at most one batch
+    key = data_key(historical_data)
+    full_params = {params: tuple(build_strategy(strategy_class, params, sl_tp_params).params) for params in candidates}
+    stored = result_store.lookup(strategy_class, full_params.values(), key, taker_fee)
+    missing = [params for params in candidates if full_params[params] not in stored]
+
+    for start in range(0, len(missing), result_store.batch_size):
+        batch = missing[start:start + result_store.batch_size]
+        balances = score_candidates(strategy_class, batch, historical_data, taker_fee, sl_tp_params, n_jobs, chunk_size,
+                                    vectorized, scorer)
+        for params, balance in zip(batch, balances):
+            stored[full_params[params]] = balance
+            result_store.add(strategy_class, full_params[params], key, taker_fee, balance)
+        result_store.flush()
+
+    instrumentation.count('optimize_cached_results', len(candidates) - len(missing))
+    return [stored[full_params[params]] for params in candidates]
+
+def optimize_strategy(strategy_class, historical_data, taker_fee, sl_tp_params=None, n_jobs=1, chunk_size=None,
+                      vectorized=False, search="grid", budget=None, seed=None, result_store=None):
+    # search is "grid" (every combination) or one of SEARCH_MODES, which evaluate at most `budget` candidates.
+    # With a results.ResultStore, already stored combinations are not backtested again.
     search_space = define_search_space(strategy_class)
-    param_combinations = list(itertools.product(*search_space))
 
     best_params = None
     best_performance = -np.inf
 
-    for params in param_combinations:
-        if strategy_class == "MovingAverageStrategy":
-            if sl_tp_params:
-                extended_params = params + sl_tp_params
-                strategy_instance = MovingAverageStrategy(extended_params)
-            else:
-                raise ValueError("Please provide stop_loss and take_profit parameters for MovingAverageStrategy.")
-        elif strategy_class == "ROCStrategy":
-            strategy_instance = ROCStrategy(params)
-        else:
-            raise ValueError("Invalid strategy type. Please use a supported strategy.")
-        signal_data = strategy_instance.generate_signals(historical_data)
+    if n_jobs is None:
+        n_jobs = os.cpu_count()
+
+    if vectorized and strategy_class not in STRATEGY_CLASSES:
+        raise ValueError(f"{strategy_class} has no signal matrix, run it with vectorized=False.")
+
+    if search != "grid" and search not in SEARCH_MODES:
+        raise ValueError(f"Invalid search mode. Please use grid, {', '.join(SEARCH_MODES)}.")
 
-        trade_report, _ = backtest(strategy_class,signal_data, taker_fee)
+    evaluations = []
+    start = time.perf_counter()
+    # One pool and one shared block per dataset for every batch the search scores
+    scorer = ParallelScorer(n_jobs) if n_jobs > 1 else None
 
-        if trade_report["balance"] > best_performance:
-            best_performance = trade_report["balance"]
+    def score(candidates, data):
+        evaluations.append(len(candidates))
+        if result_store is not None:
+            return score_with_store(strategy_class, candidates, data, taker_fee, result_store, sl_tp_params, n_jobs,
+                                    chunk_size, vectorized, scorer)
+        return score_candidates(strategy_class, candidates, data, taker_fee, sl_tp_params, n_jobs, chunk_size, vectorized,
+                                scorer)
+
+    try:
+        if search != "grid":
+            if budget is None:
+                budget = max(1, grid_size(search_space) // 10)
+            param_combinations, balances = SEARCH_MODES[search](score, historical_data, search_space, budget,
+                                                                np.random.default_rng(seed))
+            print("Backtests:", sum(evaluations), "for a grid of", grid_size(search_space))
+        else:
+            param_combinations = list(itertools.product(*search_space))
+            balances = score(param_combinations, historical_data)
+    finally:
+        if scorer is not None:
+            scorer.close()
+
+    # First-best-wins selection in evaluation order, grid order for the exhaustive search
+    for params, balance in zip(param_combinations, balances):
+        if balance > best_performance:
+            best_performance = balance
             best_params = params
-            optimized_strategy = strategy_instance
+    optimized_strategy = build_strategy(strategy_class, best_params, sl_tp_params)
+
+    elapsed = time.perf_counter() - start
+    instrumentation.count('optimize_backtests', sum(evaluations))
+    if elapsed > 0:
+        instrumentation.gauge('optimize_backtests_per_second', sum(evaluations) / elapsed)
 
     print("Best parameters:", best_params)
     print("Best performance:", best_performance)
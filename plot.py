@@ -1,10 +1,69 @@
+import os
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+import matplotlib
 import matplotlib.pyplot as plt
 import mplfinance as mpf
 import pandas as pd
 import numpy as np
 from trading import ichimoku_cloud 
 
-def plot_candlestick_chart(historical_data, trade_history=None, plot_ichimoku=False):
+FIGSIZE = (12, 6)
+PLOT_DPI = 100
+
+# Marker column, marker and color per trade kind, a sell goes into the column named after its reason
+MARKERS = [('buy', '^', 'g'), ('sell_signal', 'v', 'r'), ('stop_loss', 'v', 'purple'), ('take_profit', 'v', 'purple')]
+
+def downsample_ohlc(historical_data, max_candles):
+    # Merge consecutive candles into at most max_candles buckets keeping the extremes: first open, highest high,
+    # lowest low, last close, summed volume. Any other column (e.g. Ichimoku lines) keeps its last value.
+    n_bars = len(historical_data)
+    if max_candles is None or n_bars <= max_candles:
+        return historical_data
+    starts = np.arange(0, n_bars, -(-n_bars // max_candles))
+    ends = np.append(starts[1:], n_bars) - 1
+
+    downsampled = {}
+    for column in historical_data.columns:
+        values = historical_data[column].to_numpy()
+        if column == 'open':
+            downsampled[column] = values[starts]
+        elif column == 'high':
+            downsampled[column] = np.maximum.reduceat(values, starts)
+        elif column == 'low':
+            downsampled[column] = np.minimum.reduceat(values, starts)
+        elif column == 'volume':
+            downsampled[column] = np.add.reduceat(values, starts)
+        else:
+            downsampled[column] = values[ends]
+    return pd.DataFrame(downsampled, index=historical_data.index[starts])
+
+def marker_columns(index, trade_history, exact=True):
+    # One price column per MARKERS entry aligned to index with a single searchsorted. With exact=False (downsampled
+    # candles) a trade lands on the candle whose period contains it instead of needing an identical timestamp.
+    columns = {column: np.full(len(index), np.nan) for column, _, _ in MARKERS}
+    if not trade_history:
+        return columns
+    actions, timestamps, prices, reasons = zip(*trade_history)
+    timestamps = pd.DatetimeIndex(timestamps)
+    positions = index.searchsorted(timestamps, side='right') - 1
+    valid = positions >= 0
+    if exact:
+        valid &= index[np.maximum(positions, 0)] == timestamps
+    kinds = np.array([action if action == 'buy' else reason for action, reason in zip(actions, reasons)], dtype=object)
+    prices = np.asarray(prices, dtype=np.float64)
+    for column in columns:
+        selected = valid & (kinds == column)
+        columns[column][positions[selected]] = prices[selected]
+    return columns
+
+def plot_candlestick_chart(historical_data, trade_history=None, plot_ichimoku=False, output_file=None, max_candles=None,
+                           dump_csv=False):
+    # With output_file the chart is rendered headless to that PNG and, unless max_candles says otherwise, downsampled
+    # to one candle per pixel of the figure width. dump_csv writes additional_plots.csv and historical_data.csv.
+    if output_file and max_candles is None:
+        max_candles = FIGSIZE[0] * PLOT_DPI
+
     # Reformat historical_data for mplfinance
     historical_data = historical_data.set_index('timestamp')
 
@@ -19,6 +78,9 @@ def plot_candlestick_chart(historical_data, trade_history=None, plot_ichimoku=Fa
         historical_data['kijun_sen'] = kijun_sen
 
         historical_data = historical_data.dropna(subset=['senkou_span_a', 'senkou_span_b', 'chikou_span', 'tenkan_sen', 'kijun_sen'])  # Drop rows containing NaN values only in the Ichimoku Cloud components
+
+    n_bars = len(historical_data)
+    historical_data = downsample_ohlc(historical_data, max_candles)
     
     additional_plots = []
 
@@ -33,33 +95,47 @@ def plot_candlestick_chart(historical_data, trade_history=None, plot_ichimoku=Fa
         additional_plots.extend(ichimoku_plots)
     
     if trade_history:
-        historical_data['buy'] = np.nan
-        historical_data['sell_signal'] = np.nan
-        historical_data['stop_loss'] = np.nan
-        historical_data['take_profit'] = np.nan
-
-        for action, timestamp, price, reason in trade_history:
-            if timestamp in historical_data.index:
-                if action == 'buy':
-                    historical_data.loc[timestamp, 'buy'] = price
-                elif action == 'sell':
-                    historical_data.loc[timestamp, reason] = price
-
-        additional_plots.extend([mpf.make_addplot(historical_data['buy'], type='scatter', marker='^', markersize=100, color='g', panel=0),
-                                mpf.make_addplot(historical_data['sell_signal'], type='scatter', marker='v', markersize=100, color='r', panel=0),
-                                mpf.make_addplot(historical_data['stop_loss'], type='scatter', marker='v', markersize=100, color='purple', panel=0),
-                                mpf.make_addplot(historical_data['take_profit'], type='scatter', marker='v', markersize=100, color='purple', panel=0)])
-        
-    df = pd.DataFrame(additional_plots)
-    df.to_csv('additional_plots.csv')
-    df = pd.DataFrame(historical_data)
-    df.to_csv('historical_data.csv')
+        for column, prices in marker_columns(historical_data.index, trade_history, exact=len(historical_data) == n_bars).items():
+            historical_data[column] = prices
+
+        # mplfinance cannot scale an all-NaN scatter series, so skip marker kinds that never occurred
+        additional_plots.extend([mpf.make_addplot(historical_data[column], type='scatter', marker=marker, markersize=100, color=color, panel=0)
+                                 for column, marker, color in MARKERS if historical_data[column].notna().any()])
+
+    if dump_csv:
+        df = pd.DataFrame(additional_plots)
+        df.to_csv('additional_plots.csv')
+        df = pd.DataFrame(historical_data)
+        df.to_csv('historical_data.csv')
 
     if historical_data.empty:
         print("No data to plot.")
         return
-    
-    if additional_plots == []:
-        mpf.plot(historical_data, type='candle', style='charles', title='Candlestick Chart', ylabel='Price', figsize=(12, 6))
-    else:
-        mpf.plot(historical_data, type='candle', style='charles', title='Candlestick Chart', ylabel='Price', figsize=(12, 6), addplot=additional_plots)
\ No newline at end of file
+
+    options = dict(type='candle', style='charles', title='Candlestick Chart', ylabel='Price', figsize=FIGSIZE)
+    if additional_plots != []:
+        options['addplot'] = additional_plots
+    if max_candles is not None:
+        # Already downsampled on purpose, so mplfinance's too-much-data warning does not apply
+        options['warn_too_much_data'] = len(historical_data) + 1
+    if output_file:
+        # mplfinance closes the figure itself once it is saved
+        options['savefig'] = dict(fname=output_file, dpi=PLOT_DPI)
+    mpf.plot(historical_data, **options)
+    return output_file
+
+def _init_render_worker():
+    matplotlib.use('Agg', force=True)
+
+def _render_report(report, plot_kwargs):
+    historical_data, trade_history, output_file = report
+    return plot_candlestick_chart(historical_data, trade_history, output_file=output_file, **plot_kwargs)
+
+def render_reports(reports, output_dir='reports', n_jobs=None, **plot_kwargs):
+    # Render (name, historical_data, trade_history) reports to output_dir/<name>.png in parallel worker processes,
+    # plot_kwargs are passed on to plot_candlestick_chart. Returns the written paths in report order.
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = [(historical_data, trade_history, os.path.join(output_dir, f"{name}.png"))
+            for name, historical_data, trade_history in reports]
+    with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_render_worker) as executor:
+        return list(executor.map(_render_report, jobs, itertools.repeat(plot_kwargs)))
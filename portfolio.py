@@ -0,0 +1,166 @@
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from trading import fast_backtest
+from storage import OHLCVStore
+from strategies import MovingAverageStrategy, RSIStrategy, IchimokuStrategy, ROCStrategy
+from utils import date_to_milliseconds
+import indicators
+
+STRATEGY_CLASSES = {
+    "MovingAverageStrategy": MovingAverageStrategy,
+    "RSIStrategy": RSIStrategy,
+    "IchimokuStrategy": IchimokuStrategy,
+    "ROCStrategy": ROCStrategy,
+}
+
+# Datasets kept by each process, so every job chunk after the first on a (symbol, timeframe) skips the load
+_datasets = OrderedDict()
+_DATASET_CACHE_SIZE = 8
+
+def group_jobs(jobs):
+    # Jobs on the same (symbol, timeframe) grouped together so the candles are loaded once
+    groups = OrderedDict()
+    for index, (symbol, timeframe, strategy, params) in enumerate(jobs):
+        groups.setdefault((symbol, timeframe), []).append((index, strategy, tuple(params)))
+    return list(groups.items())
+
+def chunk_groups(groups, n_chunks):
+    # Split the groups into about n_chunks tasks of similar size, each on a single (symbol, timeframe),
+    # so the pool stays busy even when many strategies share a few symbols
+    n_jobs = sum(len(jobs) for _, jobs in groups)
+    chunk_size = max(1, -(-n_jobs // n_chunks))
+    return [(key, jobs[start:start + chunk_size]) for key, jobs in groups for start in range(0, len(jobs), chunk_size)]
+
+def load_dataset(store_root, exchange_id, symbol, timeframe, since, end_time_milliseconds):
+    key = (store_root, exchange_id, symbol, timeframe, since, end_time_milliseconds)
+    historical_data = _datasets.get(key)
+    if historical_data is None:
+        historical_data = OHLCVStore(store_root).load(exchange_id, symbol, timeframe, since, end_time_milliseconds)
+        if historical_data.empty:
+            raise ValueError(f"No cached {timeframe} candles for {symbol} on {exchange_id}, fetch them first.")
+        _datasets[key] = historical_data
+        while len(_datasets) > _DATASET_CACHE_SIZE:
+            _datasets.popitem(last=False)
+    else:
+        _datasets.move_to_end(key)
+    return historical_data
+
+def run_job_group(group, store_root, exchange_id, since, end_time_milliseconds, taker_fee, initial_balance):
+    (symbol, timeframe), jobs = group
+    historical_data = load_dataset(store_root, exchange_id, symbol, timeframe, since, end_time_milliseconds)
+
+    results = []
+    with indicators.pinned(historical_data):
+        for index, strategy, params in jobs:
+            start = time.perf_counter()
+            signals = STRATEGY_CLASSES[strategy](params).compute_signals(historical_data)
+            trade_report, trade_history = fast_backtest(strategy, historical_data, taker_fee, initial_balance,
+                                                        trade_history_file=None, signals=signals)
+            results.append({
+                "job": index,
+                "symbol": symbol,
+                "timeframe": timeframe,
+                "strategy": strategy,
+                "params": params,
+                "trade_report": trade_report,
+                "trade_history": trade_history,
+                "last_close": float(historical_data['close'].iloc[-1]),
+                "seconds": time.perf_counter() - start,
+            })
+    return results
+
+def simulate_shared_capital(results, taker_fee, initial_capital=10000, allocation=0.1):
+    # Replay every job's trades on one cash pool: each buy stakes up to allocation * initial_capital,
+    # buys are skipped while the pool is empty and open positions are marked at their last close
+    events = []
+    for result in results:
+        for action, timestamp, price, reason in result["trade_history"]:
+            # Sells before buys on the same timestamp so freed cash can be reused
+            events.append((timestamp, 0 if action == 'sell' else 1, result["job"], price))
+    events.sort(key=lambda event: event[:3])
+
+    cash = initial_capital
+    positions = {}
+    total_fees = 0
+    trades = 0
+    skipped = 0
+
+    for timestamp, is_buy, job, price in events:
+        if is_buy:
+            stake = min(cash, initial_capital * allocation)
+            if job in positions or stake <= 0:
+                skipped += 1
+                continue
+            fees = stake * taker_fee
+            positions[job] = (stake - fees) / price
+            cash -= stake
+            total_fees += fees
+            trades += 1
+        elif job in positions:
+            trade_value = positions.pop(job) * price
+            fees = trade_value * taker_fee
+            cash += trade_value - fees
+            total_fees += fees
+            trades += 1
+
+    last_close = {result["job"]: result["last_close"] for result in results}
+    balance = cash + sum(units * last_close[job] for job, units in positions.items())
+
+    return {
+        "balance": balance,
+        "performance": (balance / initial_capital - 1) * 100,
+        "total_fees": total_fees,
+        "trades": trades,
+        "skipped_buys": skipped,
+    }
+
+def run_portfolio(jobs, exchange_id, start_date, end_date, taker_fee, store_root='data', n_jobs=None,
+                  initial_balance=1000, shared_capital=None, allocation=0.1):
+    # Backtest a list of (symbol, timeframe, strategy name, params) jobs from the local OHLCV store.
+    # Returns a summary DataFrame in job order, plus the shared capital pool report when shared_capital is set.
+    since = date_to_milliseconds(start_date)
+    end_time_milliseconds = date_to_milliseconds(end_date)
+    groups = group_jobs(jobs)
+    task_args = (store_root, exchange_id, since, end_time_milliseconds, taker_fee, initial_balance)
+
+    if n_jobs is None:
+        n_jobs = os.cpu_count()
+
+    start = time.perf_counter()
+    chunks = chunk_groups(groups, n_jobs * 4) if n_jobs > 1 else groups
+    if n_jobs > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=min(n_jobs, len(chunks))) as executor:
+            futures = [executor.submit(run_job_group, chunk, *task_args) for chunk in chunks]
+            results = [result for future in futures for result in future.result()]
+    else:
+        try:
+            results = [result for group in groups for result in run_job_group(group, *task_args)]
+        finally:
+            _datasets.clear()
+    elapsed = time.perf_counter() - start
+    results.sort(key=lambda result: result["job"])
+
+    summary = pd.DataFrame([{
+        "symbol": result["symbol"],
+        "timeframe": result["timeframe"],
+        "strategy": result["strategy"],
+        "params": result["params"],
+        "balance": result["trade_report"]["balance"],
+        "performance": result["trade_report"]["performance"],
+        "just-hold-performance": result["trade_report"]["just-hold-performance"],
+        "total_fees": result["trade_report"]["total_fees"],
+        "trades": len(result["trade_history"]),
+        "seconds": result["seconds"],
+    } for result in results])
+
+    print("Jobs:", len(jobs))
+    print("Jobs per second:", len(jobs) / elapsed if elapsed else float('inf'))
+
+    pool_report = None
+    if shared_capital is not None:
+        pool_report = simulate_shared_capital(results, taker_fee, shared_capital, allocation)
+
+    return summary, pool_report
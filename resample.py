@@ -0,0 +1,129 @@
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from utils import convert_time_seconds, date_to_milliseconds
+from storage import OHLCV_COLUMNS
+from trading import fetch_historical_data
+
+# Epoch days start on a Thursday, exchanges open weekly candles on Monday
+WEEK_OFFSET_MILLISECONDS = 4 * 86400 * 1000
+
+def timeframe_milliseconds(timeframe):
+    # Months and years have no fixed length, convert_time_seconds only approximates them
+    if timeframe[-1] in ('M', 'y'):
+        raise ValueError("Invalid timeframe for resampling. Please use s, m, h, d or w.")
+    return convert_time_seconds(timeframe) * 1000
+
+def bucket_starts(timestamps, timeframe):
+    # Open time of the timeframe candle each millisecond timestamp belongs to
+    interval_milliseconds = timeframe_milliseconds(timeframe)
+    offset = WEEK_OFFSET_MILLISECONDS if timeframe[-1] == 'w' else 0
+    return (timestamps - offset) // interval_milliseconds * interval_milliseconds + offset
+
+def resample_columns(columns, base_timeframe, timeframe):
+    # Aggregate sorted base columns (millisecond timestamps) into timeframe candles: first open, max high, min low,
+    # last close, summed volume. Returns the candle columns and whether the last candle is still incomplete,
+    # i.e. it ends after the last base bar. Missing base bars inside a candle do not make it incomplete.
+    base_milliseconds = timeframe_milliseconds(base_timeframe)
+    interval_milliseconds = timeframe_milliseconds(timeframe)
+    if interval_milliseconds % base_milliseconds:
+        raise ValueError(f"{timeframe} is not a multiple of the base timeframe {base_timeframe}.")
+
+    timestamps = np.asarray(columns['timestamp'], dtype=np.int64)
+    if len(timestamps) == 0:
+        return {column: np.empty(0, dtype=np.int64 if column == 'timestamp' else np.float64) for column in OHLCV_COLUMNS}, False
+
+    buckets = bucket_starts(timestamps, timeframe)
+    starts = np.flatnonzero(np.diff(buckets, prepend=buckets[0] - 1))
+    ends = np.append(starts[1:], len(timestamps)) - 1
+
+    resampled = {
+        'timestamp': buckets[starts],
+        'open': np.asarray(columns['open'], dtype=np.float64)[starts],
+        'high': np.maximum.reduceat(np.asarray(columns['high'], dtype=np.float64), starts),
+        'low': np.minimum.reduceat(np.asarray(columns['low'], dtype=np.float64), starts),
+        'close': np.asarray(columns['close'], dtype=np.float64)[ends],
+        'volume': np.add.reduceat(np.asarray(columns['volume'], dtype=np.float64), starts),
+    }
+    partial = bool(buckets[-1] + interval_milliseconds > timestamps[-1] + base_milliseconds)
+    return resampled, partial
+
+def resample_ohlcv(historical_data, base_timeframe, timeframe, include_partial=False):
+    # resample_columns for a DataFrame shaped like fetch_historical_data's output
+    timestamps = historical_data['timestamp'].to_numpy()
+    if np.issubdtype(timestamps.dtype, np.datetime64):
+        timestamps = timestamps.astype('datetime64[ms]').astype(np.int64)
+    columns = {column: historical_data[column].to_numpy() for column in OHLCV_COLUMNS if column != 'timestamp'}
+    columns['timestamp'] = timestamps
+    resampled, partial = resample_columns(columns, base_timeframe, timeframe)
+    return _to_frame(resampled, partial and not include_partial)
+
+def _to_frame(columns, drop_last=False, first=0, last=None):
+    if last is None:
+        last = len(columns['timestamp'])
+    if drop_last:
+        last = min(last, len(columns['timestamp']) - 1)
+    historical_data = pd.DataFrame({column: columns[column][first:last] for column in OHLCV_COLUMNS})
+    historical_data['timestamp'] = pd.to_datetime(historical_data['timestamp'], unit='ms')
+    return historical_data
+
+class ResampledStore:
+    # Higher timeframes derived from the base candles of a storage.OHLCVStore, so nothing but the base timeframe is
+    # downloaded or written to disk. Resampled columns are kept in an in-memory LRU of max_entries series and extended
+    # incrementally: when base bars were appended only the last (possibly partial) candle onwards is recomputed,
+    # anything else (e.g. a hole filled by a merge) rebuilds the series.
+
+    def __init__(self, store, base_timeframe='1m', max_entries=64):
+        self.store = store
+        self.base_timeframe = base_timeframe
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+
+    def clear(self):
+        self._cache.clear()
+
+    def columns(self, exchange_id, symbol, timeframe):
+        # Up to date resampled columns and whether their last candle is incomplete
+        key = (exchange_id, symbol, timeframe)
+        base = self.store.columns(exchange_id, symbol, self.base_timeframe)
+        n_base = len(base['timestamp'])
+        entry = self._cache.get(key)
+
+        if entry is not None and entry['base_bars'] == n_base and \
+                (n_base == 0 or base['timestamp'][-1] == entry['last_base_timestamp']):
+            self._cache.move_to_end(key)
+            return entry['columns'], entry['partial']
+
+        if entry is not None and 0 < entry['base_bars'] < n_base and \
+                base['timestamp'][entry['base_bars'] - 1] == entry['last_base_timestamp']:
+            # Appended base bars: redo the last cached candle, it may have been partial, and add the new ones
+            cached = entry['columns']
+            first = np.searchsorted(base['timestamp'], cached['timestamp'][-1], side='left')
+            tail, partial = resample_columns({column: values[first:] for column, values in base.items()},
+                                             self.base_timeframe, timeframe)
+            columns = {column: np.concatenate((cached[column][:-1], tail[column])) for column in OHLCV_COLUMNS}
+        else:
+            columns, partial = resample_columns(base, self.base_timeframe, timeframe)
+
+        self._cache[key] = {'columns': columns, 'partial': partial, 'base_bars': n_base,
+                            'last_base_timestamp': int(base['timestamp'][-1]) if n_base else None}
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return columns, partial
+
+    def load(self, exchange_id, symbol, timeframe, start=None, end=None, include_partial=False):
+        # Same shape as OHLCVStore.load for any timeframe, the incomplete last candle is left out by default
+        if timeframe == self.base_timeframe:
+            return self.store.load(exchange_id, symbol, timeframe, start, end)
+        columns, partial = self.columns(exchange_id, symbol, timeframe)
+        timestamps = columns['timestamp']
+        first = 0 if start is None else np.searchsorted(timestamps, start, side='left')
+        last = len(timestamps) if end is None else np.searchsorted(timestamps, end, side='left')
+        return _to_frame(columns, partial and not include_partial, first, last)
+
+def fetch_resampled(exchange, symbol, timeframe, start_date, end_date, resampled_store):
+    # fetch_historical_data for any timeframe: only base candles are fetched into the store, the rest is resampled
+    fetch_historical_data(exchange, symbol, resampled_store.base_timeframe, start_date, end_date, store=resampled_store.store)
+    exchange_id = getattr(exchange, 'id', type(exchange).__name__)
+    return resampled_store.load(exchange_id, symbol, timeframe, date_to_milliseconds(start_date), date_to_milliseconds(end_date))
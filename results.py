@@ -0,0 +1,82 @@
+import json
+import sqlite3
+import time
+import numpy as np
+import pandas as pd
+from indicators import fingerprint
+
+# SQLite store of every evaluated (strategy, params, data range, fee) and its metrics, so sweeps can skip
+# combinations that were already scored and an interrupted sweep resumes where it stopped.
+
+def data_key(historical_data):
+    # Identifies the exact candles a backtest ran on: time range, bar count and a digest of the closes, highs and
+    # lows (stops are resolved on the highs and lows, so candles with the same closes can score differently)
+    prices = np.stack([historical_data[column].to_numpy(dtype=np.float64) for column in ('close', 'high', 'low')])
+    return "{}|{}|{}|{}".format(historical_data['timestamp'].iloc[0] if 'timestamp' in historical_data else 0,
+                                historical_data['timestamp'].iloc[-1] if 'timestamp' in historical_data else 0,
+                                len(historical_data), fingerprint(prices)[:16])
+
+class ResultStore:
+
+    def __init__(self, path='results.db', batch_size=1024):
+        self.path = path
+        self.batch_size = batch_size
+        self._pending = []
+        self._connection = sqlite3.connect(path)
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS results (
+                strategy TEXT NOT NULL,
+                params TEXT NOT NULL,
+                data_key TEXT NOT NULL,
+                taker_fee REAL NOT NULL,
+                balance REAL,
+                performance REAL,
+                created REAL NOT NULL,
+                PRIMARY KEY (strategy, params, data_key, taker_fee)
+            )""")
+        self._connection.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def lookup(self, strategy, params_list, key, taker_fee):
+        # {params: balance} for the params that are already stored
+        self.flush()
+        stored = {}
+        encoded = {json.dumps(list(params)): tuple(params) for params in params_list}
+        names = list(encoded)
+        for start in range(0, len(names), 500):
+            chunk = names[start:start + 500]
+            rows = self._connection.execute(
+                f"SELECT params, balance FROM results WHERE strategy = ? AND data_key = ? AND taker_fee = ? "
+                f"AND params IN ({', '.join('?' * len(chunk))})", [strategy, key, taker_fee, *chunk])
+            for params, balance in rows:
+                stored[encoded[params]] = balance if balance is not None else float('nan')
+        return stored
+
+    def add(self, strategy, params, key, taker_fee, balance, initial_balance=1000):
+        self._pending.append((strategy, json.dumps(list(params)), key, taker_fee, balance,
+                              (balance / initial_balance - 1) * 100, time.time()))
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self._pending:
+            self._connection.executemany("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)", self._pending)
+            self._connection.commit()
+            self._pending = []
+
+    def close(self):
+        self.flush()
+        self._connection.close()
+
+    def results(self, strategy=None):
+        self.flush()
+        query = "SELECT * FROM results" + (" WHERE strategy = ?" if strategy else "") + " ORDER BY balance DESC"
+        frame = pd.read_sql_query(query, self._connection, params=[strategy] if strategy else None)
+        frame['params'] = frame['params'].map(lambda params: tuple(json.loads(params)))
+        return frame
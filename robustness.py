@@ -0,0 +1,84 @@
+import numpy as np
+
+# Shuffled return matrices are built this many elements at a time, ~32 MB each
+MONTE_CARLO_CHUNK_ELEMENTS = 4_000_000
+
+PERCENTILES = [5, 25, 50, 75, 95]
+
+def trade_returns(trade_history, taker_fee, final_price=None):
+    # Balance multiplier of every round trip in a backtest trade_history, with the backtest's fee math:
+    # a buy charges balance / price * fee (so keeps 1 - fee / price of the balance), a sell keeps 1 - fee of the value.
+    # A buy while already holding wipes the position in backtest(), so that round trip returns 0.
+    # An open position is marked at final_price without a fee, like the backtest, or dropped without it.
+    returns = []
+    entry = None
+    for action, _, price, _ in trade_history:
+        if action == 'buy':
+            if entry is not None:
+                returns.append(0.0)
+            entry = price
+        elif entry is not None:
+            returns.append((1 - taker_fee / entry) * (1 - taker_fee) * price / entry)
+            entry = None
+    if entry is not None and final_price is not None:
+        returns.append((1 - taker_fee / entry) * final_price / entry)
+    return np.asarray(returns, dtype=np.float64)
+
+def monte_carlo(returns, n_resamples=10000, method="bootstrap", initial_balance=1000, seed=None):
+    # Final balance and max drawdown (fraction of the running peak) of every resampled trade sequence.
+    # bootstrap draws trades with replacement, shuffle only reorders them, so its final balances are all equal
+    # and only the drawdowns vary. Equity is stepped one trade at a time across all resamples, which keeps the
+    # work in long contiguous vector operations and bootstrap memory at a few arrays of n_resamples.
+    if method not in ("bootstrap", "shuffle"):
+        raise ValueError("Invalid resampling method. Please use bootstrap or shuffle.")
+    returns = np.asarray(returns, dtype=np.float64)
+    n_trades = len(returns)
+    final_balances = np.full(n_resamples, float(initial_balance))
+    max_drawdowns = np.zeros(n_resamples)
+    if n_trades == 0:
+        return final_balances, max_drawdowns
+
+    rng = np.random.default_rng(seed)
+    chunk = n_resamples if method == "bootstrap" else max(1, MONTE_CARLO_CHUNK_ELEMENTS // n_trades)
+    for start in range(0, n_resamples, chunk):
+        size = min(chunk, n_resamples - start)
+        if method == "bootstrap":
+            steps = (returns[rng.integers(0, n_trades, size, dtype=np.int32)] for _ in range(n_trades))
+        else:
+            # Column j is an independent permutation of the trades
+            steps = rng.permuted(np.broadcast_to(returns[:, None], (n_trades, size)), axis=0)
+
+        # In units of initial_balance, the peak includes the starting balance
+        equity = np.ones(size)
+        peak = np.ones(size)
+        worst = np.ones(size)
+        ratio = np.empty(size)
+        for factors in steps:
+            np.multiply(equity, factors, out=equity)
+            np.maximum(peak, equity, out=peak)
+            np.divide(equity, peak, out=ratio)
+            np.minimum(worst, ratio, out=worst)
+        final_balances[start:start + size] = initial_balance * equity
+        max_drawdowns[start:start + size] = 1 - worst
+    return final_balances, max_drawdowns
+
+def robustness_report(trade_history, taker_fee, n_resamples=10000, method="bootstrap", initial_balance=1000,
+                      ruin_drawdown=0.5, final_price=None, seed=None):
+    # Distribution summary in the style of trade_report: percentiles of the final balance and max drawdown (%),
+    # and the share of resamples that lose ruin_drawdown of their peak balance at some point.
+    returns = trade_returns(trade_history, taker_fee, final_price)
+    final_balances, max_drawdowns = monte_carlo(returns, n_resamples, method, initial_balance, seed)
+
+    report = {
+        "method": method,
+        "trades": len(returns),
+        "resamples": n_resamples,
+        "final-balance-mean": float(final_balances.mean()),
+        "max-drawdown-mean": float(max_drawdowns.mean() * 100),
+    }
+    for percentile, balance, drawdown in zip(PERCENTILES, np.percentile(final_balances, PERCENTILES),
+                                             np.percentile(max_drawdowns, PERCENTILES)):
+        report[f"final-balance-p{percentile}"] = float(balance)
+        report[f"max-drawdown-p{percentile}"] = float(drawdown * 100)
+    report["ruin-probability"] = float((max_drawdowns >= ruin_drawdown).mean())
+    return report
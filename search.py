@@ -0,0 +1,111 @@
+import math
+import numpy as np
+
+# Adaptive alternatives to the exhaustive itertools.product grid in optimization.optimize_strategy.
+# Every search takes score(candidates, data) -> balances, a search space (a list of value lists),
+# an evaluation budget and a numpy Generator, and returns (candidates, balances) scored on the full data.
+
+def grid_size(search_space):
+    return math.prod(len(values) for values in search_space)
+
+def decode_index(index, search_space):
+    # Grid position -> params tuple, in the same order as itertools.product(*search_space)
+    params = []
+    for values in reversed(search_space):
+        index, position = divmod(index, len(values))
+        params.append(values[position])
+    return tuple(reversed(params))
+
+def sample_candidates(search_space, count, rng):
+    # `count` distinct grid points, drawn without building the whole grid
+    count = min(count, grid_size(search_space))
+    indices = rng.choice(grid_size(search_space), size=count, replace=False)
+    return [decode_index(int(index), search_space) for index in indices]
+
+def random_search(score, historical_data, search_space, budget, rng):
+    candidates = sample_candidates(search_space, budget, rng)
+    return candidates, score(candidates, historical_data)
+
+def halving_plan(budget, eta, rungs):
+    # Largest starting pool whose rungs (pool, pool / eta, pool / eta^2, ...) fit in the budget
+    def cost(pool):
+        return sum(max(1, pool // eta ** rung) for rung in range(rungs))
+
+    pool = budget
+    while pool > 1 and cost(pool) > budget:
+        pool -= 1
+    return pool
+
+def successive_halving(score, historical_data, search_space, budget, rng, eta=2, rungs=2, min_bars=200):
+    # Score a wide random pool on the most recent 1/eta^(rungs-1) of history, keep the best 1/eta,
+    # and rescore the survivors on an eta times longer slice until the last rung uses all bars.
+    # Shorter first rungs (eta=3, rungs=3 scores on the last ninth) rank too noisily to keep the real optimum.
+    candidates = sample_candidates(search_space, halving_plan(budget, eta, rungs), rng)
+
+    for rung in range(rungs):
+        last_rung = rung == rungs - 1 or len(candidates) == 1
+        bars = len(historical_data) if last_rung else max(min_bars, int(len(historical_data) / eta ** (rungs - 1 - rung)))
+        balances = score(candidates, historical_data.iloc[-bars:].reset_index(drop=True))
+        if last_rung:
+            return candidates, balances
+        # Stable sort keeps the earlier candidate on ties, like the grid's first-best-wins rule
+        keep = max(1, len(candidates) // eta)
+        order = sorted(range(len(candidates)), key=lambda i: -balances[i] if balances[i] == balances[i] else math.inf)
+        candidates = [candidates[i] for i in sorted(order[:keep])]
+
+def _smoothed_density(positions, size):
+    # Per-value probabilities from observed grid positions, spread to neighbouring values and
+    # mixed with a uniform prior so no value ever gets zero probability
+    counts = np.bincount(positions, minlength=size).astype(np.float64)
+    counts = np.convolve(counts, [0.25, 0.5, 0.25], mode='same')
+    return (counts + 1.0 / size) / (counts.sum() + 1.0)
+
+def tpe_search(score, historical_data, search_space, budget, rng, n_startup=None, gamma=0.25, n_samples=32):
+    # Tree-structured Parzen estimator over the discrete grid: split the evaluated points into the best
+    # gamma fraction and the rest, then evaluate the sample that maximises l(x) / g(x) per dimension
+    total = grid_size(search_space)
+    budget = min(budget, total)
+    if n_startup is None:
+        n_startup = max(min(10, budget), budget // 5)
+
+    candidates = sample_candidates(search_space, n_startup, rng)
+    balances = list(score(candidates, historical_data))
+    seen = set(candidates)
+    position_of = [{value: position for position, value in enumerate(values)} for values in search_space]
+
+    while len(candidates) < budget:
+        positions = np.array([[position_of[dim][value] for dim, value in enumerate(params)] for params in candidates])
+        ranked = np.argsort([-balance if balance == balance else math.inf for balance in balances], kind='stable')
+        n_good = max(1, int(math.ceil(gamma * len(candidates))))
+        good, bad = positions[ranked[:n_good]], positions[ranked[n_good:]]
+
+        samples = np.empty((n_samples, len(search_space)), dtype=np.int64)
+        log_ratio = np.zeros(n_samples)
+        for dim, values in enumerate(search_space):
+            good_density = _smoothed_density(good[:, dim], len(values))
+            bad_density = _smoothed_density(bad[:, dim], len(values)) if len(bad) else np.full(len(values), 1.0 / len(values))
+            samples[:, dim] = rng.choice(len(values), size=n_samples, p=good_density)
+            log_ratio += np.log(good_density[samples[:, dim]]) - np.log(bad_density[samples[:, dim]])
+
+        choice = None
+        for sample in np.argsort(-log_ratio, kind='stable'):
+            params = tuple(values[samples[sample, dim]] for dim, values in enumerate(search_space))
+            if params not in seen:
+                choice = params
+                break
+        if choice is None:
+            # Every sample was already evaluated, fall back to an unseen random point
+            while choice is None or choice in seen:
+                choice = decode_index(int(rng.integers(total)), search_space)
+
+        seen.add(choice)
+        candidates.append(choice)
+        balances.extend(score([choice], historical_data))
+
+    return candidates, balances
+
+SEARCH_MODES = {
+    "random": random_search,
+    "halving": successive_halving,
+    "tpe": tpe_search,
+}
@@ -0,0 +1,126 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+
+OHLCV_COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+COLUMN_DTYPES = {
+    'timestamp': np.int64,
+    'open': np.float64,
+    'high': np.float64,
+    'low': np.float64,
+    'close': np.float64,
+    'volume': np.float64,
+}
+
+def merge_ranges(ranges):
+    # Merge overlapping or touching [start, end) millisecond ranges
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+def subtract_ranges(start, end, covered):
+    # Parts of [start, end) that are not inside any of the covered ranges
+    missing = []
+    for covered_start, covered_end in covered:
+        if covered_end <= start or covered_start >= end:
+            continue
+        if covered_start > start:
+            missing.append((start, covered_start))
+        start = max(start, covered_end)
+    if start < end:
+        missing.append((start, end))
+    return missing
+
+class OHLCVStore:
+    # On-disk columnar candle store, one directory per (exchange, symbol, timeframe).
+    # Each column is a raw little-endian file that is read back through np.memmap, and
+    # coverage.json records which [start, end) ranges have already been fetched.
+
+    def __init__(self, root='data'):
+        self.root = root
+
+    def _path(self, exchange_id, symbol, timeframe):
+        return os.path.join(self.root, exchange_id, symbol.replace('/', '-'), timeframe)
+
+    def _column_file(self, path, column):
+        return os.path.join(path, f"{column}.bin")
+
+    def coverage(self, exchange_id, symbol, timeframe):
+        coverage_file = os.path.join(self._path(exchange_id, symbol, timeframe), 'coverage.json')
+        if not os.path.exists(coverage_file):
+            return []
+        with open(coverage_file) as f:
+            return json.load(f)
+
+    def missing_ranges(self, exchange_id, symbol, timeframe, start, end):
+        return subtract_ranges(start, end, self.coverage(exchange_id, symbol, timeframe))
+
+    def columns(self, exchange_id, symbol, timeframe):
+        # Read-only memory maps of every stored column
+        path = self._path(exchange_id, symbol, timeframe)
+        columns = {}
+        for column in OHLCV_COLUMNS:
+            column_file = self._column_file(path, column)
+            if not os.path.exists(column_file) or os.path.getsize(column_file) == 0:
+                columns[column] = np.empty(0, dtype=COLUMN_DTYPES[column])
+            else:
+                columns[column] = np.memmap(column_file, dtype=COLUMN_DTYPES[column], mode='r')
+        return columns
+
+    def write(self, exchange_id, symbol, timeframe, ohlcv, start, end):
+        # Store raw ccxt candles ([timestamp, open, high, low, close, volume] rows) and mark [start, end) as fetched
+        path = self._path(exchange_id, symbol, timeframe)
+        os.makedirs(path, exist_ok=True)
+
+        new = np.asarray(ohlcv, dtype=np.float64).reshape(-1, len(OHLCV_COLUMNS))
+        new_timestamps = new[:, 0].astype(np.int64)
+        stored = self.columns(exchange_id, symbol, timeframe)
+
+        if len(new):
+            if len(stored['timestamp']) == 0 or new_timestamps.min() > stored['timestamp'][-1]:
+                # Newer than anything stored: append to the column files
+                order = np.argsort(new_timestamps, kind='stable')
+                _, unique = np.unique(new_timestamps[order][::-1], return_index=True)
+                keep = order[::-1][unique]
+                for index, column in enumerate(OHLCV_COLUMNS):
+                    values = new_timestamps[keep] if column == 'timestamp' else new[keep, index]
+                    with open(self._column_file(path, column), 'ab') as f:
+                        f.write(values.astype(COLUMN_DTYPES[column]).tobytes())
+            else:
+                # Fills a hole or an earlier edge: merge, keep the newest copy of each candle and rewrite
+                timestamps = np.concatenate((np.asarray(stored['timestamp']), new_timestamps))
+                _, unique = np.unique(timestamps[::-1], return_index=True)
+                keep = len(timestamps) - 1 - unique
+                merged = {}
+                for index, column in enumerate(OHLCV_COLUMNS):
+                    values = timestamps if column == 'timestamp' else np.concatenate((np.asarray(stored[column]), new[:, index]))
+                    merged[column] = values[keep].astype(COLUMN_DTYPES[column])
+                del stored
+                for column, values in merged.items():
+                    column_file = self._column_file(path, column)
+                    values.tofile(column_file + '.tmp')
+                    os.replace(column_file + '.tmp', column_file)
+
+        coverage = self.coverage(exchange_id, symbol, timeframe)
+        if end > start:
+            coverage = merge_ranges(coverage + [[start, end]])
+        coverage_file = os.path.join(path, 'coverage.json')
+        with open(coverage_file + '.tmp', 'w') as f:
+            json.dump(coverage, f)
+        os.replace(coverage_file + '.tmp', coverage_file)
+
+    def load(self, exchange_id, symbol, timeframe, start=None, end=None):
+        # Candles with start <= timestamp < end as a DataFrame shaped like fetch_historical_data's output
+        columns = self.columns(exchange_id, symbol, timeframe)
+        timestamps = columns['timestamp']
+        first = 0 if start is None else np.searchsorted(timestamps, start, side='left')
+        last = len(timestamps) if end is None else np.searchsorted(timestamps, end, side='left')
+
+        historical_data = pd.DataFrame({column: np.array(values[first:last]) for column, values in columns.items()})
+        historical_data['timestamp'] = pd.to_datetime(historical_data['timestamp'], unit='ms')
+        return historical_data
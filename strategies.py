@@ -1,109 +1,366 @@
 from abc import ABC, abstractmethod
+import math
 import numpy as np
-import talib
+import pandas as pd
+from incremental import RingBuffer, RollingMean, WilderRSI, RollingExtreme
+from trading import ichimoku_cloud
+from instrumentation import instrumented
+import indicators
+
+def rolling_means(values, windows):
+    # Every requested simple moving average, one O(n) pass per window. Uses the same pandas rolling mean as
+    # indicators.sma so exact ties (common on tick-rounded prices) and therefore crossovers agree bit for bit
+    # with compute_signals; a cumulative-sum difference would round them apart.
+    series = pd.Series(values, dtype=np.float64, copy=False)
+    return {window: series.rolling(window=window).mean().to_numpy() for window in windows}
+
+def shifted(values, periods=1):
+    # numpy counterpart of Series.shift(periods), padding with NaN
+    result = np.full(len(values), np.nan)
+    if periods >= 0:
+        result[periods:] = values[:len(values) - periods]
+    else:
+        result[:periods] = values[-periods:]
+    return result
+
+def crossover_signals(fast, slow, out):
+    # The crossover rule used in generate_signals for one pair of moving averages, written into the int8 row out
+    fast_prev, slow_prev = shifted(fast), shifted(slow)
+    out[(fast > slow) & (fast_prev <= slow_prev)] = 1
+    out[(fast < slow) & (fast_prev >= slow_prev)] = -1
+    return out
+
+def signal_matrix(n_bars, n_params):
+    # (n_bars x n_params) int8 signals stored one candidate per row, so filling and scanning a column is contiguous
+    return np.zeros((n_params, n_bars), dtype=np.int8).T
+
+def alternating(buy_signals, sell_signals):
+    # Keep the first buy after a sell (or the start) and the first sell after a buy. Level rules such as RSI below
+    # a threshold fire on every bar of an episode, and a buy while holding spends the whole position in the backtest.
+    signal = buy_signals.astype(np.int8) - sell_signals.astype(np.int8)
+    events = np.flatnonzero(signal)
+    values = signal[events]
+    # Only the first event of every run of equal events is kept, so the kept events alternate
+    keep = values != np.concatenate(([-1], values[:-1]))
+    signal[:] = 0
+    signal[events[keep]] = values[keep]
+    return signal == 1, signal == -1
+
+class Signals:
+    # Compact output of compute_signals: an int8 signal per bar (1 buy, -1 sell), the stop-loss and
+    # take-profit levels set on buy bars (0 elsewhere) and, on request, read-only indicator arrays.
+    # Levels are float64 like the optimizer's; dtype=np.float32 halves them but can move an exit by a rounding.
+
+    __slots__ = ('signal', 'stop_loss', 'take_profit', 'indicators')
+
+    def __init__(self, signal, stop_loss, take_profit, indicators=None):
+        self.signal = signal
+        self.stop_loss = stop_loss
+        self.take_profit = take_profit
+        self.indicators = indicators or {}
+
+    def __len__(self):
+        return len(self.signal)
+
+    @classmethod
+    def from_rules(cls, close, buy_signals, sell_signals, stop_loss_pct, take_profit_pct, dtype, indicators=None):
+        signal = np.zeros(len(close), dtype=np.int8)
+        signal[buy_signals] = 1
+        signal[sell_signals] = -1
+        stop_loss = np.where(buy_signals, close * stop_loss_pct, 0.0).astype(dtype, copy=False)
+        take_profit = np.where(buy_signals, close * take_profit_pct, 0.0).astype(dtype, copy=False)
+        return cls(signal, stop_loss, take_profit, indicators)
 
 class BaseStrategy(ABC):
 
+    # Bars that update() needs to see before its signals can be non-zero
+    warmup_period = 1
+
     def __init__(self, params):
         self.params = params
+        self.last_stop_loss = 0.0
+        self.last_take_profit = 0.0
 
     @abstractmethod
+    def compute_signals(self, data, dtype=np.float64, include_indicators=False):
+        # Signals for data without modifying it, see Signals
+        pass
+
     def generate_signals(self, data):
+        # Writes the indicator, signal, stop_loss and take_profit columns into data and returns it
+        signals = self.compute_signals(data, dtype=np.float64, include_indicators=True)
+        for name, values in signals.indicators.items():
+            data[name] = values
+        data['signal'] = signals.signal.astype(np.int64)
+        data['stop_loss'] = signals.stop_loss
+        data['take_profit'] = signals.take_profit
+        return data
+
+    @abstractmethod
+    def level_multipliers(self):
+        # (stop_loss, take_profit) multipliers of the close on a buy bar
         pass
+
+    @abstractmethod
+    def reset(self):
+        # Clear the incremental state used by update()
+        pass
+
+    @abstractmethod
+    def update(self, bar):
+        # Feed one closed bar (a mapping with 'high', 'low' and 'close') and return its signal
+        pass
+
+    def update_signals(self, data):
+        # Run every row of data through update(), the incremental counterpart of generate_signals(data)['signal']
+        self.reset()
+        return np.array([self.update(bar) for bar in data[['high', 'low', 'close']].to_dict('records')], dtype=np.int8)
+
+    def _set_levels(self, signal, close, stop_loss_pct, take_profit_pct):
+        if signal == 1:
+            self.last_stop_loss = close * stop_loss_pct
+            self.last_take_profit = close * take_profit_pct
+        else:
+            self.last_stop_loss = 0.0
+            self.last_take_profit = 0.0
 class MovingAverageStrategy(BaseStrategy):
     
     def __init__(self, params):
         super().__init__(params)
         self.short_ma_period, self.long_ma_period, self.stop_loss, self.take_profit = self.params
+        self.warmup_period = self.long_ma_period + 1
+        self.reset()
 
-    def generate_signals(self, data):
-        data['short_mavg'] = data['close'].rolling(window=self.short_ma_period).mean()
-        data['long_mavg'] = data['close'].rolling(window=self.long_ma_period).mean()
-        data['signal'] = 0
-        data['stop_loss'] = 0.0
-        data['take_profit'] = 0.0
+    def reset(self):
+        self._short_mavg = RollingMean(self.short_ma_period)
+        self._long_mavg = RollingMean(self.long_ma_period)
+        self._previous_short_mavg = math.nan
+        self._previous_long_mavg = math.nan
+
+    def update(self, bar):
+        close = bar['close']
+        short_mavg = self._short_mavg.update(close)
+        long_mavg = self._long_mavg.update(close)
 
-        buy_signals = (data['short_mavg'] > data['long_mavg']) & (data['short_mavg'].shift(1) <= data['long_mavg'].shift(1))
-        sell_signals = (data['short_mavg'] < data['long_mavg']) & (data['short_mavg'].shift(1) >= data['long_mavg'].shift(1))
+        signal = 0
+        if short_mavg > long_mavg and self._previous_short_mavg <= self._previous_long_mavg:
+            signal = 1
+        elif short_mavg < long_mavg and self._previous_short_mavg >= self._previous_long_mavg:
+            signal = -1
 
-        data.loc[buy_signals, 'signal'] = 1
-        data.loc[sell_signals, 'signal'] = -1
+        self._previous_short_mavg = short_mavg
+        self._previous_long_mavg = long_mavg
+        self._set_levels(signal, close, *self.level_multipliers())
+        return signal
 
+    @instrumented('signals')
+    def compute_signals(self, data, dtype=np.float64, include_indicators=False):
+        close = data['close'].to_numpy(dtype=np.float64)
+        short_mavg = indicators.sma(data['close'], self.short_ma_period).to_numpy()
+        long_mavg = indicators.sma(data['close'], self.long_ma_period).to_numpy()
+        short_prev, long_prev = shifted(short_mavg), shifted(long_mavg)
+
+        buy_signals = (short_mavg > long_mavg) & (short_prev <= long_prev)
+        sell_signals = (short_mavg < long_mavg) & (short_prev >= long_prev)
+
+        stop_loss_pct, take_profit_pct = self.level_multipliers()
+
+        return Signals.from_rules(close, buy_signals, sell_signals, stop_loss_pct, take_profit_pct, dtype,
+                                  {'short_mavg': short_mavg, 'long_mavg': long_mavg} if include_indicators else None)
+
+    def level_multipliers(self):
         # Define your desired stop-loss and take-profit percentages
-        stop_loss_pct = 0.98  # 2% stop-loss
-        take_profit_pct = 1.05  # 5% take-profit
+        return 0.98, 1.05  # 2% stop-loss, 5% take-profit
 
-        data.loc[buy_signals, 'stop_loss'] = data.loc[buy_signals, 'close'] * stop_loss_pct
-        data.loc[buy_signals, 'take_profit'] = data.loc[buy_signals, 'close'] * take_profit_pct
+    @classmethod
+    @instrumented('signals')
+    def generate_signal_matrix(cls, data, param_grid):
+        # Signals for every params tuple at once: an (n_bars x n_params) int8 matrix plus per-column stop/target multipliers
+        close = data['close'].to_numpy(dtype=np.float64)
+        mavgs = rolling_means(close, sorted({window for params in param_grid for window in params[:2]}))
+        signals = signal_matrix(len(close), len(param_grid))
+        for column, params in enumerate(param_grid):
+            crossover_signals(mavgs[params[0]], mavgs[params[1]], signals[:, column])
+        stop_loss_pct = np.full(len(param_grid), 0.98)
+        take_profit_pct = np.full(len(param_grid), 1.05)
 
-        return data
+        return signals, stop_loss_pct, take_profit_pct
     
+# Periods of history update() needs before its RSI has converged, like talib's unstable period
+RSI_WARMUP_PERIODS = 20
+
 class RSIStrategy(BaseStrategy):
 
     def __init__(self, params):
         super().__init__(params)
         self.rsi_period, self.overbought_threshold, self.oversold_threshold, self.stop_loss, self.take_profit = self.params
+        # Wilder smoothing never forgets its seed, after 20 periods its weight is below e^-20 and the live RSI
+        # matches the one computed over the full history. Which of buy or sell comes next is settled by the first
+        # oversold or overbought bar of the warm-up.
+        self.warmup_period = RSI_WARMUP_PERIODS * self.rsi_period + 1
+        self.reset()
 
-    def generate_signals(self, data):
-        data['rsi'] = talib.RSI(data['close'], timeperiod=self.rsi_period)
-        data['signal'] = 0
-        data['stop_loss'] = 0.0
-        data['take_profit'] = 0.0
+    def reset(self):
+        self._rsi = WilderRSI(self.rsi_period)
+        self._last_signal = -1
 
-        buy_signals = data['rsi'] < self.oversold_threshold
-        sell_signals = data['rsi'] > self.overbought_threshold
+    def update(self, bar):
+        close = bar['close']
+        rsi = self._rsi.update(close)
 
-        data.loc[buy_signals, 'signal'] = 1
-        data.loc[sell_signals, 'signal'] = -1
+        signal = 0
+        if rsi < self.oversold_threshold and self._last_signal != 1:
+            signal = 1
+        elif rsi > self.overbought_threshold and self._last_signal != -1:
+            signal = -1
 
-        # Define your desired stop-loss and take-profit percentages
-        stop_loss_pct = 1 - self.stop_loss  # stop_loss should be provided as a percentage, e.g., 0.02 for 2%
-        take_profit_pct = 1 + self.take_profit  # take_profit should be provided as a percentage, e.g., 0.05 for 5%
+        if signal:
+            self._last_signal = signal
+        self._set_levels(signal, close, *self.level_multipliers())
+        return signal
 
-        data.loc[buy_signals, 'stop_loss'] = data.loc[buy_signals, 'close'] * stop_loss_pct
-        data.loc[buy_signals, 'take_profit'] = data.loc[buy_signals, 'close'] * take_profit_pct
+    @instrumented('signals')
+    def compute_signals(self, data, dtype=np.float64, include_indicators=False):
+        close = data['close'].to_numpy(dtype=np.float64)
+        rsi = indicators.rsi(data['close'], self.rsi_period).to_numpy()
 
-        return data
+        buy_signals, sell_signals = alternating(rsi < self.oversold_threshold, rsi > self.overbought_threshold)
+
+        stop_loss_pct, take_profit_pct = self.level_multipliers()
+
+        return Signals.from_rules(close, buy_signals, sell_signals, stop_loss_pct, take_profit_pct, dtype,
+                                  {'rsi': rsi} if include_indicators else None)
+
+    def level_multipliers(self):
+        # stop_loss and take_profit should be provided as percentages, e.g., 0.02 for 2%
+        return 1 - self.stop_loss, 1 + self.take_profit
     
 class IchimokuStrategy(BaseStrategy):
 
     def __init__(self, params):
         super().__init__(params)
         self.stop_loss, self.take_profit = self.params
+        self.warmup_period = 52 + 26 + 1
+        self.reset()
 
-    def generate_signals(self, data):
-        data['tenkan_sen'], data['kijun_sen'], data['senkou_span_a'], data['senkou_span_b'], data['chikou_span'] = talib.ICHIMOKU(
-            data['high'], data['low'], tenkan_sen_period=9, kijun_sen_period=26, senkou_span_b_period=52, chikou_span_period=26)
+    def reset(self):
+        self._conversion_high = RollingExtreme(9, 'max')
+        self._conversion_low = RollingExtreme(9, 'min')
+        self._base_high = RollingExtreme(26, 'max')
+        self._base_low = RollingExtreme(26, 'min')
+        self._span_b_high = RollingExtreme(52, 'max')
+        self._span_b_low = RollingExtreme(52, 'min')
+        # Leading spans are plotted 26 bars ahead, so keep the last 27 unshifted values
+        self._span_a_values = RingBuffer(26 + 1)
+        self._span_b_values = RingBuffer(26 + 1)
+        self._previous_close = math.nan
 
-        data['signal'] = 0
-        data['stop_loss'] = 0.0
-        data['take_profit'] = 0.0
+    def update(self, bar):
+        # generate_signals compares each bar with the *next* close, so the signal returned
+        # here belongs to the previous bar and is only known once this bar has closed
+        high, low, close = bar['high'], bar['low'], bar['close']
+        conversion_line = (self._conversion_high.update(high) + self._conversion_low.update(low)) / 2
+        base_line = (self._base_high.update(high) + self._base_low.update(low)) / 2
+        self._span_a_values.append((conversion_line + base_line) / 2)
+        self._span_b_values.append((self._span_b_high.update(high) + self._span_b_low.update(low)) / 2)
 
-        buy_signals = (data['close'].shift(-1) > data['senkou_span_a'].shift(-1)) & (data['close'].shift(-1) > data['senkou_span_b'].shift(-1))
-        sell_signals = (data['close'].shift(-1) < data['senkou_span_a'].shift(-1)) & (data['close'].shift(-1) < data['senkou_span_b'].shift(-1))
+        span_a = self._span_a_values[0] if self._span_a_values.full() else math.nan
+        span_b = self._span_b_values[0] if self._span_b_values.full() else math.nan
 
-        data.loc[buy_signals, 'signal'] = 1
-        data.loc[sell_signals, 'signal'] = -1
+        signal = 0
+        if close > span_a and close > span_b:
+            signal = 1
+        elif close < span_a and close < span_b:
+            signal = -1
 
-        data.loc[buy_signals, 'stop_loss'] = data.loc[buy_signals, 'close'] * self.stop_loss
-        data.loc[buy_signals, 'take_profit'] = data.loc[buy_signals, 'close'] * self.take_profit
+        self._set_levels(signal, self._previous_close, *self.level_multipliers())
+        self._previous_close = close
+        return signal
 
-        return data
+    @instrumented('signals')
+    def compute_signals(self, data, dtype=np.float64, include_indicators=False):
+        close = data['close'].to_numpy(dtype=np.float64)
+        tenkan_sen, kijun_sen, senkou_span_a, senkou_span_b, chikou_span = ichimoku_cloud(
+            data, conversion_line_period=9, base_line_period=26, lagging_span2_period=52, displacement=26)
+        next_close = shifted(close, -1)
+        next_span_a = shifted(senkou_span_a.to_numpy(), -1)
+        next_span_b = shifted(senkou_span_b.to_numpy(), -1)
+
+        buy_signals = (next_close > next_span_a) & (next_close > next_span_b)
+        sell_signals = (next_close < next_span_a) & (next_close < next_span_b)
+
+        ichimoku = None
+        if include_indicators:
+            ichimoku = {'tenkan_sen': tenkan_sen.to_numpy(), 'kijun_sen': kijun_sen.to_numpy(), 'senkou_span_a': senkou_span_a.to_numpy(),
+                        'senkou_span_b': senkou_span_b.to_numpy(), 'chikou_span': chikou_span.to_numpy()}
+        stop_loss_pct, take_profit_pct = self.level_multipliers()
+        return Signals.from_rules(close, buy_signals, sell_signals, stop_loss_pct, take_profit_pct, dtype, ichimoku)
+
+    def level_multipliers(self):
+        # Ichimoku params are the multipliers themselves, e.g. (0.98, 1.05)
+        return self.stop_loss, self.take_profit
 
 class ROCStrategy(BaseStrategy):
     
     def __init__(self, params):
         super().__init__(params)
         self.roc_period, self.roc_threshold, self.stop_loss, self.take_profit = params
+        self.warmup_period = self.roc_period + 2
+        self.reset()
 
-    def generate_signals(self, data):
-        data['roc'] = data['close'].pct_change(periods=self.roc_period) * 100
-        data['signal'] = 0
+    def reset(self):
+        self._closes = RingBuffer(self.roc_period + 1)
+        self._previous_roc = math.nan
 
-        buy_signals = (data['roc'] > self.roc_threshold) & (data['roc'].shift(1) <= self.roc_threshold)
-        sell_signals = (data['roc'] < -self.roc_threshold) & (data['roc'].shift(1) >= -self.roc_threshold)
+    def update(self, bar):
+        close = bar['close']
+        self._closes.append(close)
+        roc = (close / self._closes[0] - 1) * 100 if self._closes.full() else math.nan
 
-        data.loc[buy_signals, 'signal'] = 1
-        data.loc[sell_signals, 'signal'] = -1
+        signal = 0
+        if roc > self.roc_threshold and self._previous_roc <= self.roc_threshold:
+            signal = 1
+        elif roc < -self.roc_threshold and self._previous_roc >= -self.roc_threshold:
+            signal = -1
 
-        return data
+        self._previous_roc = roc
+        self._set_levels(signal, close, *self.level_multipliers())
+        return signal
+
+    @instrumented('signals')
+    def compute_signals(self, data, dtype=np.float64, include_indicators=False):
+        close = data['close'].to_numpy(dtype=np.float64)
+        roc = indicators.roc(data['close'], self.roc_period).to_numpy()
+        roc_prev = shifted(roc)
+
+        buy_signals = (roc > self.roc_threshold) & (roc_prev <= self.roc_threshold)
+        sell_signals = (roc < -self.roc_threshold) & (roc_prev >= -self.roc_threshold)
+
+        stop_loss_pct, take_profit_pct = self.level_multipliers()
+
+        return Signals.from_rules(close, buy_signals, sell_signals, stop_loss_pct, take_profit_pct, dtype,
+                                  {'roc': roc} if include_indicators else None)
+
+    def level_multipliers(self):
+        return 1 - self.stop_loss, 1 + self.take_profit
+
+    @classmethod
+    @instrumented('signals')
+    def generate_signal_matrix(cls, data, param_grid):
+        # Signals for every params tuple at once: an (n_bars x n_params) int8 matrix plus per-column stop/target multipliers
+        close = data['close'].to_numpy(dtype=np.float64)
+        rocs = {}
+        for period in sorted({params[0] for params in param_grid}):
+            roc = np.full(len(close), np.nan)
+            roc[period:] = (close[period:] / close[:-period] - 1) * 100
+            rocs[period] = roc, shifted(roc)
+        signals = signal_matrix(len(close), len(param_grid))
+        for column, params in enumerate(param_grid):
+            (roc, roc_prev), threshold = rocs[params[0]], params[1]
+            signal = signals[:, column]
+            signal[(roc > threshold) & (roc_prev <= threshold)] = 1
+            signal[(roc < -threshold) & (roc_prev >= -threshold)] = -1
+        stop_loss_pct = np.array([1 - params[2] for params in param_grid])
+        take_profit_pct = np.array([1 + params[3] for params in param_grid])
+
+        return signals, stop_loss_pct, take_profit_pct
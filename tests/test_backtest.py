@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+import pytest
+from benchmarks.data import synthetic_ohlcv
+from strategies import MovingAverageStrategy, RSIStrategy, IchimokuStrategy, ROCStrategy
+from trading import backtest, fast_backtest, intrabar_levels
+
+TAKER_FEE = 0.001
+
+STRATEGIES = [
+    MovingAverageStrategy((11, 21, 0.02, 0.05)),
+    RSIStrategy((14, 70, 30, 0.02, 0.05)),
+    IchimokuStrategy((0.98, 1.05)),
+    ROCStrategy((10, 1.5, 0.02, 0.05)),
+]
+
+def assert_same_backtest(strategy_name, data):
+    expected_report, expected_history = backtest(strategy_name, data, TAKER_FEE)
+    report, history = fast_backtest(strategy_name, data, TAKER_FEE)
+    assert report == expected_report
+    assert history == expected_history
+
+@pytest.mark.parametrize("strategy", STRATEGIES, ids=lambda strategy: type(strategy).__name__)
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_fast_backtest_matches_backtest(strategy, seed):
+    data = strategy.generate_signals(synthetic_ohlcv(3000, seed=seed))
+    assert_same_backtest(type(strategy).__name__, data)
+
+def test_buy_while_holding_wipes_the_position():
+    # The second buy spends the zero balance, so the position is gone and the sell signal finds nothing to sell
+    data = strategy_frame(signal=[1, 1, 0, -1, 0])
+    report, history = fast_backtest("manual", data, TAKER_FEE)
+    assert [action for action, _, _, _ in history] == ['buy', 'buy']
+    assert report["balance"] == 0
+    assert_same_backtest("manual", data)
+
+def test_open_position_is_marked_at_the_last_close():
+    data = strategy_frame(signal=[0, 1, 0, 0, 0])
+    report, history = fast_backtest("manual", data, TAKER_FEE)
+    assert [action for action, _, _, _ in history] == ['buy']
+    assert report["balance"] > 0
+    assert_same_backtest("manual", data)
+
+def test_exit_priority_stop_loss_then_take_profit_then_signal():
+    # Bar 2 touches both levels and has a sell signal, bar 4 only the target
+    data = strategy_frame(signal=[1, 0, -1, 1, 0], high=[101, 101, 120, 101, 120], low=[99, 99, 80, 99, 99])
+    _, history = fast_backtest("manual", data, TAKER_FEE)
+    assert [reason for action, _, _, reason in history if action == 'sell'] == ['stop_loss', 'take_profit']
+    assert_same_backtest("manual", data)
+
+def intrabar_exit(bar_high, bar_low, sub_bars):
+    # Buy at 100 on bar 0 (stop 95, target 110), bar 1 touches both levels on the hour and is replayed on the
+    # given 15m (open, high, low) sub-bars; returns the sell and the final balance
+    data = strategy_frame(signal=[1, 0, 0], high=[101, bar_high, 101], low=[99, bar_low, 99])
+    sub_data = pd.DataFrame({
+        'timestamp': pd.date_range('2022-01-01 01:00', periods=len(sub_bars), freq='15min'),
+        'open': [bar[0] for bar in sub_bars],
+        'high': [bar[1] for bar in sub_bars],
+        'low': [bar[2] for bar in sub_bars],
+        'close': [bar[0] for bar in sub_bars],
+        'volume': 1.0,
+    })
+    report, history = fast_backtest("manual", data, TAKER_FEE, intrabar=intrabar_levels(data, sub_data, '1h'))
+    assert [action for action, _, _, _ in history] == ['buy', 'sell']
+    return history[1], report["balance"]
+
+def sold_at(price):
+    # 1000 spent at 100 with backtest's buy fee, sold at price
+    position = (1000 - 1000 / 100 * TAKER_FEE) / 100
+    return position * price * (1 - TAKER_FEE)
+
+def test_intrabar_target_reached_before_the_stop():
+    (_, _, price, reason), balance = intrabar_exit(112, 80, [(100, 111, 99), (105, 106, 80), (90, 91, 85), (90, 91, 85)])
+    assert (reason, price) == ('take_profit', 110)
+    assert balance == pytest.approx(sold_at(110))
+
+def test_intrabar_sub_bar_touching_both_levels_stops_out():
+    (_, _, price, reason), balance = intrabar_exit(112, 80, [(100, 112, 80), (100, 101, 99), (100, 101, 99), (100, 101, 99)])
+    assert (reason, price) == ('stop_loss', 95)
+    assert balance == pytest.approx(sold_at(95))
+
+def test_intrabar_gap_through_the_stop_fills_at_the_open():
+    (_, _, price, reason), balance = intrabar_exit(112, 80, [(100, 101, 99), (90, 91, 80), (100, 112, 99), (100, 101, 99)])
+    assert (reason, price) == ('stop_loss', 90)
+    assert balance == pytest.approx(sold_at(90))
+
+def test_intrabar_gap_through_the_target_fills_at_the_open():
+    (_, _, price, reason), balance = intrabar_exit(120, 80, [(100, 101, 99), (115, 120, 80), (100, 101, 99), (100, 101, 99)])
+    assert (reason, price) == ('take_profit', 115)
+    assert balance == pytest.approx(sold_at(115))
+
+def strategy_frame(signal, high=None, low=None):
+    n_bars = len(signal)
+    close = np.full(n_bars, 100.0)
+    return pd.DataFrame({
+        'timestamp': pd.date_range('2022-01-01', periods=n_bars, freq='1h'),
+        'open': close,
+        'high': np.asarray(high if high is not None else [101.0] * n_bars, dtype=np.float64),
+        'low': np.asarray(low if low is not None else [99.0] * n_bars, dtype=np.float64),
+        'close': close,
+        'volume': np.ones(n_bars),
+        'signal': signal,
+        'stop_loss': np.where(np.asarray(signal) == 1, 95.0, 0.0),
+        'take_profit': np.where(np.asarray(signal) == 1, 110.0, 0.0),
+    })
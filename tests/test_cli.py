@@ -0,0 +1,15 @@
+import datetime
+import json
+import cli
+
+def test_backtest_after_fetch_up_to_tomorrow(tmp_path, monkeypatch, capsys):
+    # The open candle is never stored as covered, the backtest must still accept the fetched range
+    monkeypatch.chdir(tmp_path)
+    today = datetime.datetime.now(datetime.timezone.utc).date()
+    config = {"exchange": "fake", "symbol": "BTC/USDT", "interval": "1h", "taker_fee": 0.001,
+              "start_date": str(today - datetime.timedelta(days=3)), "end_date": str(today + datetime.timedelta(days=1))}
+    (tmp_path / "config.json").write_text(json.dumps(config))
+
+    assert cli.main(["fetch", "--config", "config.json"]) == 0
+    assert cli.main(["backtest", "--config", "config.json"]) == 0
+    assert "Final balance (USD):" in capsys.readouterr().out
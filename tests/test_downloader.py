@@ -0,0 +1,66 @@
+import asyncio
+import time
+import pandas as pd
+from downloader import fetch_historical_data_async, fetch_many_async, limiter_for
+from fake_exchange import FakeExchange, AsyncFakeExchange
+from storage import OHLCVStore, merge_ranges, subtract_ranges
+from trading import fetch_historical_data
+
+START, END = '2022-01-01', '2022-01-03'
+
+def test_async_fetch_matches_sync_fetch():
+    expected = fetch_historical_data(FakeExchange(rateLimit=1, max_limit=500), 'BTC/USDT', '1m', START, END)
+    frames = asyncio.run(fetch_many_async(AsyncFakeExchange(rateLimit=1, max_limit=500), ['BTC/USDT', 'ETH/USDT'], '1m',
+                                          START, END, page_limit=500))
+    assert len(expected) == 2 * 1440
+    pd.testing.assert_frame_equal(frames['BTC/USDT'], expected)
+    pd.testing.assert_frame_equal(frames['ETH/USDT'], expected)
+
+def test_covered_range_is_served_from_the_store(tmp_path):
+    store = OHLCVStore(str(tmp_path))
+    exchange = FakeExchange(rateLimit=1, max_limit=500)
+    first = fetch_historical_data(exchange, 'BTC/USDT', '1m', START, END, store=store)
+    requests = exchange.requests
+
+    again = fetch_historical_data(exchange, 'BTC/USDT', '1m', START, END, store=store)
+    async_exchange = AsyncFakeExchange(rateLimit=1, max_limit=500)
+    async_again = asyncio.run(fetch_historical_data_async(async_exchange, 'BTC/USDT', '1m', START, END, store=store))
+
+    assert exchange.requests == requests
+    assert async_exchange.requests == 0
+    pd.testing.assert_frame_equal(again, first)
+    pd.testing.assert_frame_equal(async_again, first)
+
+def test_only_the_gaps_are_fetched(tmp_path):
+    store = OHLCVStore(str(tmp_path))
+    exchange = FakeExchange(rateLimit=1, max_limit=100)
+    fetch_historical_data(exchange, 'BTC/USDT', '1m', '2022-01-01', '2022-01-02', store=store)
+    fetch_historical_data(exchange, 'BTC/USDT', '1m', '2022-01-03', '2022-01-04', store=store)
+    requests = exchange.requests
+
+    historical_data = fetch_historical_data(exchange, 'BTC/USDT', '1m', '2022-01-01', '2022-01-04', store=store)
+    # Only the 1440 missing candles of 2022-01-02 are requested, in pages of 100
+    assert exchange.requests - requests == 15
+    assert store.coverage('fake', 'BTC/USDT', '1m') == [[1640995200000, 1641254400000]]
+    expected = fetch_historical_data(FakeExchange(rateLimit=1), 'BTC/USDT', '1m', '2022-01-01', '2022-01-04')
+    pd.testing.assert_frame_equal(historical_data, expected)
+
+def test_merge_ranges():
+    assert merge_ranges([]) == []
+    assert merge_ranges([[20, 30], [0, 10], [10, 15], [25, 40], [50, 60]]) == [[0, 15], [20, 40], [50, 60]]
+
+def test_subtract_ranges():
+    covered = [[10, 20], [30, 40]]
+    assert subtract_ranges(0, 50, covered) == [(0, 10), (20, 30), (40, 50)]
+    assert subtract_ranges(12, 35, covered) == [(20, 30)]
+    assert subtract_ranges(10, 20, covered) == []
+    assert subtract_ranges(0, 50, []) == [(0, 50)]
+
+def test_limiter_spaces_requests_without_a_burst():
+    async def main():
+        limiter = limiter_for(AsyncFakeExchange(rateLimit=10))
+        start = time.monotonic()
+        await asyncio.gather(*(limiter.acquire() for _ in range(6)))
+        return time.monotonic() - start
+    # The first request goes out at once, the other five wait 10 ms each
+    assert asyncio.run(main()) >= 0.045
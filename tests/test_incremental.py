@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+from benchmarks.data import synthetic_ohlcv
+from strategies import MovingAverageStrategy, RSIStrategy, IchimokuStrategy, ROCStrategy
+
+STRATEGIES = [
+    MovingAverageStrategy((11, 21, 0.02, 0.05)),
+    RSIStrategy((14, 70, 30, 0.02, 0.05)),
+    ROCStrategy((10, 1.5, 0.02, 0.05)),
+]
+
+@pytest.mark.parametrize("strategy", STRATEGIES, ids=lambda strategy: type(strategy).__name__)
+@pytest.mark.parametrize("seed", [0, 1])
+def test_update_signals_match_generate_signals(strategy, seed):
+    data = synthetic_ohlcv(3000, seed=seed)
+    expected = strategy.generate_signals(data.copy())['signal'].to_numpy()
+    np.testing.assert_array_equal(strategy.update_signals(data), expected)
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_ichimoku_update_lags_generate_signals_by_one_bar(seed):
+    # generate_signals looks at the next close, so update() only knows a bar's signal once the next one closed
+    strategy = IchimokuStrategy((0.98, 1.05))
+    data = synthetic_ohlcv(3000, seed=seed)
+    expected = strategy.generate_signals(data.copy())['signal'].to_numpy()
+    signals = strategy.update_signals(data)
+    assert signals[0] == 0
+    np.testing.assert_array_equal(signals[1:], expected[:-1])
+
+@pytest.mark.parametrize("strategy", STRATEGIES + [IchimokuStrategy((0.98, 1.05))], ids=lambda strategy: type(strategy).__name__)
+def test_warmup_period_is_enough_for_live_signals(strategy):
+    # run_trading_bot seeds update() with only warmup_period bars, its signals must still match the full history
+    data = synthetic_ohlcv(3000, seed=2)
+    expected = strategy.generate_signals(data.copy())['signal'].to_numpy()
+    lag = 1 if isinstance(strategy, IchimokuStrategy) else 0
+    bars = data[['high', 'low', 'close']].to_dict('records')
+    for end in range(strategy.warmup_period + 50, len(bars), 23):
+        strategy.reset()
+        for bar in bars[end - strategy.warmup_period:end]:
+            signal = strategy.update(bar)
+        assert signal == expected[end - 1 - lag], f"bar {end - 1}"
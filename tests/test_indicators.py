@@ -0,0 +1,49 @@
+import time
+import numpy as np
+from benchmarks.data import synthetic_ohlcv
+import indicators
+from indicators import IndicatorCache
+from results import data_key
+
+def test_in_place_edit_is_not_served_from_the_cache():
+    historical_data = synthetic_ohlcv(20000, seed=0)
+    cache = IndicatorCache()
+    before = indicators.sma(historical_data['close'], 21, cache=cache)
+    key = data_key(historical_data)
+
+    historical_data.loc[12345, 'close'] *= 1.5
+    after = indicators.sma(historical_data['close'], 21, cache=cache)
+
+    assert cache.misses == 2
+    assert after[12345] != before[12345]
+    assert after.equals(historical_data['close'].rolling(window=21).mean())
+    assert data_key(historical_data) != key
+
+def test_pinned_lookup_is_cheaper_than_computing():
+    historical_data = synthetic_ohlcv(1_000_000, seed=0)
+    cache = IndicatorCache()
+    close = historical_data['close']
+
+    start = time.perf_counter()
+    expected = indicators.rsi(close, 14, cache=cache)
+    compute = time.perf_counter() - start
+    with indicators.pinned(historical_data):
+        lookups = []
+        for _ in range(5):
+            start = time.perf_counter()
+            rsi = indicators.rsi(historical_data['close'], 14, cache=cache)
+            lookups.append(time.perf_counter() - start)
+
+    assert cache.misses == 1 and cache.hits == 5
+    assert rsi.equals(expected)
+    assert min(lookups) < compute / 10
+
+def test_pinned_slices_are_hashed_on_their_own():
+    historical_data = synthetic_ohlcv(5000, seed=0)
+    cache = IndicatorCache()
+    with indicators.pinned(historical_data):
+        full = indicators.sma(historical_data['close'], 21, cache=cache)
+        tail = indicators.sma(historical_data['close'].iloc[-1000:].reset_index(drop=True), 21, cache=cache)
+    assert cache.misses == 2
+    np.testing.assert_allclose(tail.to_numpy()[20:], full.to_numpy()[-980:], rtol=1e-12)
+    assert indicators._pinned == {}
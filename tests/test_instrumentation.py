@@ -0,0 +1,54 @@
+import json
+import pytest
+import instrumentation
+from fake_exchange import FakeExchange
+from trading import fetch_ohlcv_range
+
+@pytest.fixture
+def metrics():
+    instrumentation.reset()
+    instrumentation.enable()
+    yield
+    instrumentation.disable()
+    instrumentation.reset()
+
+class BodyExchange(FakeExchange):
+    # Keeps a ccxt-style decoded response body with multi-byte characters next to every page
+    def fetch_ohlcv(self, symbol, timeframe='1m', since=None, limit=None, params={}):
+        ohlcv = super().fetch_ohlcv(symbol, timeframe, since, limit, params)
+        self.last_http_response = json.dumps({"symbol": "BTC/€", "candles": ohlcv}, ensure_ascii=False)
+        self.body_bytes = getattr(self, 'body_bytes', 0) + len(self.last_http_response.encode('utf-8'))
+        return ohlcv
+
+def test_fetch_bytes_counts_encoded_bytes(metrics):
+    exchange = BodyExchange(rateLimit=0, max_limit=100)
+    rows = fetch_ohlcv_range(exchange, 'BTC/USDT', '1m', 0, 250 * 60000)
+    counters = instrumentation.report()["counters"]
+    assert len(rows) == 250
+    assert counters["fetch_requests"] == 3
+    assert counters["fetch_bytes"] == exchange.body_bytes
+
+def test_to_prometheus_output(metrics):
+    instrumentation.count('fetch_rows', 250)
+    instrumentation.gauge('open_positions', 2)
+    instrumentation.observe('order_latency', 0.003, buckets=(0.001, 0.01))
+    instrumentation.observe('order_latency', 0.5, buckets=(0.001, 0.01))
+    with instrumentation.timed('backtest'):
+        pass
+
+    lines = instrumentation.to_prometheus().splitlines()
+    assert lines[0] == "# TYPE trading_bot_stage_calls_total counter"
+    assert lines[1] == 'trading_bot_stage_calls_total{stage="backtest"} 1'
+    assert lines[8:] == [
+        "# TYPE trading_bot_fetch_rows_total counter",
+        "trading_bot_fetch_rows_total 250.0",
+        "# TYPE trading_bot_open_positions gauge",
+        "trading_bot_open_positions 2",
+        "# TYPE trading_bot_order_latency histogram",
+        'trading_bot_order_latency_bucket{le="0.001"} 0',
+        'trading_bot_order_latency_bucket{le="0.01"} 1',
+        'trading_bot_order_latency_bucket{le="+Inf"} 2',
+        "trading_bot_order_latency_sum 0.503",
+        "trading_bot_order_latency_count 2",
+    ]
+    assert instrumentation.to_prometheus(prefix='bot').startswith("# TYPE bot_stage_calls_total counter\n")
@@ -0,0 +1,41 @@
+import asyncio
+from fake_exchange import AsyncFakeExchange
+from live import LiveEngine, run_live
+
+SYMBOLS = ['BTC/USDT', 'ETH/USDT', 'SOL/USDT']
+
+class Alternating:
+    # Buys and sells on alternate bars, so every tick with a new bar sends orders and refreshes balances
+    warmup_period = 2
+
+    def reset(self):
+        self.bars = 0
+
+    def update(self, bar):
+        self.bars += 1
+        return 1 if self.bars % 2 else -1
+
+def test_network_failures_do_not_stop_the_engine():
+    exchange = AsyncFakeExchange(failure_rate=0.3, rateLimit=1, symbols=SYMBOLS, seed=1)
+    engine = run_live(exchange, {symbol: Alternating() for symbol in SYMBOLS}, '1s', ticks=10, update_interval=0.3,
+                      retry_delay=0.01)
+    assert engine.orders
+    assert all(engine.last_timestamps[symbol] > 0 for symbol in SYMBOLS)
+
+def test_failed_poll_is_skipped_for_the_tick():
+    async def main():
+        exchange = AsyncFakeExchange(rateLimit=1, symbols=SYMBOLS)
+        engine = LiveEngine(exchange, {symbol: Alternating() for symbol in SYMBOLS}, '1s', retries=1, retry_delay=0.01)
+        await engine.markets()
+        await asyncio.gather(engine.refresh_balances(), *(engine.warmup(symbol) for symbol in SYMBOLS))
+        last_timestamps = dict(engine.last_timestamps)
+
+        await asyncio.sleep(1.1)
+        exchange.failure_rate = 1.0
+        assert await engine.tick() == []
+        assert engine.last_timestamps == last_timestamps
+
+        exchange.failure_rate = 0.0
+        await engine.tick()
+        assert all(engine.last_timestamps[symbol] > last_timestamps[symbol] for symbol in SYMBOLS)
+    asyncio.run(main())
@@ -0,0 +1,47 @@
+import pytest
+from benchmarks.data import synthetic_ohlcv
+from optimization import optimize_strategy, score_candidates, ParallelScorer
+from results import ResultStore
+
+SL_TP = (0.03, 0.06)
+
+@pytest.fixture(scope="module")
+def historical_data():
+    return synthetic_ohlcv(3000, seed=0)
+
+@pytest.mark.parametrize("search", ["grid", "halving", "tpe"])
+def test_parallel_matches_serial(historical_data, search):
+    options = dict(search=search, budget=None if search == "grid" else 40, seed=0)
+    serial = optimize_strategy("ROCStrategy", historical_data, 0.001, SL_TP, n_jobs=1, **options)
+    parallel = optimize_strategy("ROCStrategy", historical_data, 0.001, SL_TP, n_jobs=2, **options)
+    assert parallel.params == serial.params
+
+def test_scorer_reuses_pool_and_blocks(historical_data):
+    candidates = [(period, 1.5) for period in range(5, 15)]
+    expected = score_candidates("ROCStrategy", candidates, historical_data, 0.001, SL_TP)
+    with ParallelScorer(2) as scorer:
+        first = score_candidates("ROCStrategy", candidates, historical_data, 0.001, SL_TP, n_jobs=2, scorer=scorer)
+        second = score_candidates("ROCStrategy", candidates[:3], historical_data, 0.001, SL_TP, n_jobs=2, scorer=scorer)
+        assert len(scorer._blocks) == 1
+    assert first == expected
+    assert second == expected[:3]
+
+def test_store_batches_match_serial(historical_data, tmp_path):
+    serial = optimize_strategy("ROCStrategy", historical_data, 0.001, SL_TP, n_jobs=1)
+    with ResultStore(str(tmp_path / "results.db"), batch_size=50) as store:
+        parallel = optimize_strategy("ROCStrategy", historical_data, 0.001, SL_TP, n_jobs=2, result_store=store)
+    assert parallel.params == serial.params
+
+def test_reported_backtest_matches_optimizer_score(historical_data):
+    # main.py, cli.py and portfolio.py backtest the winner on compute_signals() with its default dtype, which must
+    # give the optimizer's stop levels and score
+    from trading import fast_backtest
+    best = optimize_strategy("ROCStrategy", historical_data, 0.001, SL_TP)
+    signals = best.compute_signals(historical_data)
+    generated = best.generate_signals(historical_data.copy())
+    assert signals.stop_loss.tolist() == generated['stop_loss'].tolist()
+    assert signals.take_profit.tolist() == generated['take_profit'].tolist()
+
+    expected = score_candidates("ROCStrategy", [best.params[:2]], historical_data, 0.001, SL_TP)[0]
+    trade_report, _ = fast_backtest("ROCStrategy", historical_data, 0.001, signals=signals)
+    assert trade_report["balance"] == expected
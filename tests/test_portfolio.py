@@ -0,0 +1,45 @@
+import pandas as pd
+import pytest
+from fake_exchange import FakeExchange
+from portfolio import run_portfolio, simulate_shared_capital
+from storage import OHLCVStore
+from trading import fetch_historical_data
+
+START, END = '2022-01-01', '2022-01-04'
+JOBS = [(symbol, '1m', strategy, params) for symbol in ['BTC/USDT', 'ETH/USDT']
+        for strategy, params in [("MovingAverageStrategy", (11, 21, 0.02, 0.05)), ("MovingAverageStrategy", (20, 50, 0.02, 0.05)),
+                                 ("RSIStrategy", (14, 70, 30, 0.02, 0.05)), ("ROCStrategy", (10, 0.5, 0.02, 0.05))]]
+
+@pytest.fixture(scope="module")
+def store_root(tmp_path_factory):
+    root = str(tmp_path_factory.mktemp("data"))
+    exchange = FakeExchange(rateLimit=1)
+    for symbol in ['BTC/USDT', 'ETH/USDT']:
+        fetch_historical_data(exchange, symbol, '1m', START, END, store=OHLCVStore(root))
+    return root
+
+def test_parallel_report_matches_serial(store_root):
+    serial, serial_pool = run_portfolio(JOBS, 'fake', START, END, 0.001, store_root, n_jobs=1, shared_capital=10000)
+    parallel, parallel_pool = run_portfolio(JOBS, 'fake', START, END, 0.001, store_root, n_jobs=2, shared_capital=10000)
+    assert serial["trades"].sum() > 0
+    pd.testing.assert_frame_equal(parallel.drop(columns="seconds"), serial.drop(columns="seconds"))
+    assert parallel_pool == serial_pool
+
+def test_missing_candles_raise(store_root):
+    with pytest.raises(ValueError):
+        run_portfolio([("SOL/USDT", "1m", "MovingAverageStrategy", (11, 21, 0.02, 0.05))], 'fake', START, END, 0.001, store_root, n_jobs=1)
+
+def test_shared_capital_by_hand():
+    results = [
+        {"job": 0, "last_close": 12.0, "trade_history": [('buy', 1, 10.0, None), ('sell', 3, 12.0, 'signal')]},
+        {"job": 1, "last_close": 25.0, "trade_history": [('buy', 2, 20.0, None)]},
+        {"job": 2, "last_close": 4.4, "trade_history": [('buy', 2, 5.0, None), ('buy', 3, 4.0, None)]},
+    ]
+    report = simulate_shared_capital(results, taker_fee=0.01, initial_capital=1000, allocation=0.5)
+    # t1: job 0 stakes 500, 5 fees, 49.5 units; t2: job 1 stakes the other 500 for 24.75 units, job 2 finds no cash.
+    # t3: job 0 sells 49.5 * 12 = 594 (5.94 fees) before job 2 stakes 500 at 4 for 123.75 units, leaving 88.06 cash.
+    assert report["balance"] == pytest.approx(88.06 + 24.75 * 25 + 123.75 * 4.4)
+    assert report["total_fees"] == pytest.approx(20.94)
+    assert report["trades"] == 4
+    assert report["skipped_buys"] == 1
+    assert report["performance"] == pytest.approx((report["balance"] / 1000 - 1) * 100)
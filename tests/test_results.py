@@ -0,0 +1,18 @@
+import pandas as pd
+import pytest
+from benchmarks.data import synthetic_ohlcv
+from results import data_key
+
+@pytest.mark.parametrize("column", ["close", "high", "low"])
+def test_data_key_changes_with_prices_the_backtest_reads(column):
+    historical_data = synthetic_ohlcv(2000, seed=0)
+    key = data_key(historical_data)
+    historical_data.loc[1000, column] *= 1.01
+    assert data_key(historical_data) != key
+
+def test_data_key_changes_with_the_time_range():
+    historical_data = synthetic_ohlcv(2000, seed=0)
+    shifted = historical_data.copy()
+    shifted['timestamp'] += pd.Timedelta(minutes=1)
+    assert data_key(shifted) != data_key(historical_data)
+    assert data_key(historical_data.copy()) == data_key(historical_data)
@@ -0,0 +1,54 @@
+import itertools
+import numpy as np
+import pytest
+from benchmarks.data import synthetic_ohlcv
+from optimization import define_search_space, score_candidates
+from search import SEARCH_MODES, sample_candidates
+
+# ROC with stop-loss and take-profit dimensions: small enough to score exhaustively, structured enough to search
+SEARCH_SPACE = [range(5, 21), [x / 10.0 for x in range(10, 31)], [0.01, 0.02, 0.03], [0.02, 0.04, 0.06]]
+BUDGET = 100
+
+@pytest.fixture(scope="module")
+def historical_data():
+    return synthetic_ohlcv(3000, seed=0)
+
+@pytest.fixture(scope="module")
+def grid_balances(historical_data):
+    return np.array(score_candidates("ROCStrategy", list(itertools.product(*SEARCH_SPACE)), historical_data, 0.001,
+                                     vectorized=True))
+
+def run_search(mode, historical_data, seed):
+    scored = []
+
+    def score(candidates, data):
+        scored.extend(candidates)
+        return score_candidates("ROCStrategy", candidates, data, 0.001, vectorized=True)
+
+    candidates, balances = SEARCH_MODES[mode](score, historical_data, SEARCH_SPACE, BUDGET, np.random.default_rng(seed))
+    return candidates, balances, scored
+
+@pytest.mark.parametrize("mode", list(SEARCH_MODES))
+def test_search_stays_within_budget(mode, historical_data):
+    candidates, balances, scored = run_search(mode, historical_data, 0)
+    assert len(scored) <= BUDGET
+    assert len(candidates) == len(balances) == len(set(candidates))
+    assert all(value in values for params in candidates for value, values in zip(params, SEARCH_SPACE))
+
+@pytest.mark.parametrize("mode", list(SEARCH_MODES))
+def test_search_is_deterministic_for_a_seed(mode, historical_data):
+    assert run_search(mode, historical_data, 3)[:2] == run_search(mode, historical_data, 3)[:2]
+
+@pytest.mark.parametrize("mode", list(SEARCH_MODES))
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_search_gets_close_to_the_grid_optimum(mode, seed, historical_data, grid_balances):
+    # BUDGET is about 3% of the 3024 point grid, the best found must still be in its top 5%
+    _, balances, _ = run_search(mode, historical_data, seed)
+    assert max(balances) >= np.percentile(grid_balances, 95)
+
+def test_rsi_search_space_trades(historical_data):
+    # A candidate that never trades (1000) or loses its whole position (0) gives the search nothing to rank
+    candidates = sample_candidates(define_search_space("RSIStrategy"), 300, np.random.default_rng(0))
+    balances = np.array(score_candidates("RSIStrategy", candidates, historical_data, 0.001))
+    assert ((balances == 0) | (balances == 1000)).mean() < 0.05
+    assert len(np.unique(balances)) > 250
@@ -0,0 +1,45 @@
+import itertools
+import numpy as np
+import pytest
+from benchmarks.data import synthetic_ohlcv
+from optimization import define_search_space, evaluate_params
+
+TAKER_FEE = 0.001
+
+def tick_rounded(n_bars, seed):
+    # Two-decimal prices make the short and long SMAs tie exactly on many bars
+    data = synthetic_ohlcv(n_bars, seed=seed, start_price=1500.0)
+    for column in ['open', 'high', 'low', 'close']:
+        data[column] = data[column].round(2)
+    return data
+
+@pytest.mark.parametrize("strategy_class", ["MovingAverageStrategy", "ROCStrategy"])
+@pytest.mark.parametrize("seed", [0, 1])
+def test_signal_matrix_matches_per_candidate_signals(strategy_class, seed):
+    data = tick_rounded(20000, seed)
+    candidates = list(itertools.product(*define_search_space(strategy_class)))[:120]
+    expected = evaluate_params(strategy_class, candidates, data, TAKER_FEE, (0.02, 0.05), vectorized=False)
+    balances = evaluate_params(strategy_class, candidates, data, TAKER_FEE, (0.02, 0.05), vectorized=True)
+    np.testing.assert_array_equal(balances, expected)
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_backtest_batch_matches_backtest_arrays(seed):
+    # Dense random signals: columns that buy while holding (wiping the position), hit stops, or end holding
+    from trading import backtest_arrays, backtest_batch
+    rng = np.random.default_rng(seed)
+    data = synthetic_ohlcv(3000, seed=seed)
+    close, high, low = (data[column].to_numpy() for column in ['close', 'high', 'low'])
+    density = rng.uniform(0.001, 0.05, size=40)
+    signals = np.where(rng.random((3000, 40)) < density, rng.choice([-1, 1], size=(3000, 40)), 0).astype(np.int8)
+    signals[:, 0] = 0
+    signals[-200:, 1] = 0
+    signals[-200, 1] = 1
+    stop_loss_pct = rng.uniform(0.97, 0.999, size=40)
+    take_profit_pct = rng.uniform(1.001, 1.05, size=40)
+
+    balances, fees = backtest_batch(close, high, low, signals, stop_loss_pct, take_profit_pct, TAKER_FEE)
+    for column in range(40):
+        expected_balance, expected_fees, _ = backtest_arrays(close, high, low, signals[:, column], close * stop_loss_pct[column],
+                                                             close * take_profit_pct[column], TAKER_FEE)
+        assert balances[column] == expected_balance
+        assert fees[column] == expected_fees
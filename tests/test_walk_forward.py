@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+from benchmarks.data import synthetic_ohlcv
+from optimization import build_strategy, define_search_space
+from search import sample_candidates
+from trading import backtest_arrays
+import walk_forward
+from walk_forward import compute_features, run_fold, walk_forward_optimize
+
+@pytest.fixture(scope="module")
+def historical_data():
+    return synthetic_ohlcv(4000, seed=0)
+
+def serial_balances(strategy_class, candidates, historical_data, fold):
+    # The reference: one backtest_arrays run per candidate on its own compute_signals output
+    train = slice(fold[0], fold[1])
+    data = historical_data.iloc[train].reset_index(drop=True)
+    balances = []
+    for params in candidates:
+        signals = build_strategy(strategy_class, params).compute_signals(historical_data, dtype=np.float64)
+        balances.append(backtest_arrays(data['close'].to_numpy(), data['high'].to_numpy(), data['low'].to_numpy(),
+                                        signals.signal[train], signals.stop_loss[train], signals.take_profit[train], 0.001, 1)[0])
+    return balances
+
+def test_rsi_fold_matches_per_candidate_backtests(historical_data):
+    candidates = sample_candidates(define_search_space("RSIStrategy"), 40, np.random.default_rng(0))
+    features = compute_features("RSIStrategy", historical_data, candidates)
+    assert set(features) == {'close', 'high', 'low', 'signals', 'stop_loss_pct', 'take_profit_pct'}
+    fold = (500, 3000, 3000, 4000)
+    expected = serial_balances("RSIStrategy", candidates, historical_data, fold)
+    best, train_balance, _, _, _ = run_fold(features, fold, 0.001)
+    assert best == int(np.argmax(expected))
+    assert train_balance == expected[best]
+
+def test_full_grid_over_the_cap_asks_for_candidates(historical_data, monkeypatch):
+    monkeypatch.setattr(walk_forward, "MAX_SIGNAL_CELLS", 1_000_000)
+    with pytest.raises(ValueError, match="sample_candidates"):
+        walk_forward_optimize("RSIStrategy", historical_data, 0.001, 2000, 1000, n_jobs=1)
@@ -1,7 +1,13 @@
 import pandas as pd
 import numpy as np
 import time
-from utils import date_to_milliseconds, milliseconds_to_date
+from utils import date_to_milliseconds, milliseconds_to_date, convert_time_seconds
+import instrumentation
+from instrumentation import instrumented
+import indicators
+
+# Bars converted to Python floats at a time by backtest_arrays
+BACKTEST_BLOCK_SIZE = 65536
 
 def fetch_balance(exchange):
     balance = exchange.fetch_balance()
@@ -22,34 +28,56 @@ def calculate_hold_performance(historical_data, initial_balance=1000):
     return performance_percentage
 
 
-def fetch_historical_data(exchange, symbol, timeframe, start_date, end_date):
-    since = date_to_milliseconds(start_date)
-    end_time_milliseconds = date_to_milliseconds(end_date)
-
+@instrumented('fetch')
+def fetch_ohlcv_range(exchange, symbol, timeframe, since, end_time_milliseconds):
+    # Raw ccxt candles for [since, end_time_milliseconds), one exchange page at a time
     interval_milliseconds = exchange.parse_timeframe(timeframe) * 1000
-    
+
     all_data = []
 
     while since < end_time_milliseconds:
         limit = (end_time_milliseconds - since) // interval_milliseconds
         ohlcv = exchange.fetch_ohlcv(symbol, timeframe, since, limit)
+        instrumentation.count('fetch_requests')
         
         # If there's no more data, break the loop
         if not ohlcv:
             break
 
-        # Convert the data to a pandas DataFrame and append it to the all_data list
-        df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-        all_data.append(df)
+        all_data.extend(ohlcv)
+        instrumentation.count('fetch_rows', len(ohlcv))
+        # ccxt keeps the decoded body text, count its UTF-8 size rather than its characters
+        response = getattr(exchange, 'last_http_response', None) or ''
+        instrumentation.count('fetch_bytes', len(response.encode() if isinstance(response, str) else response))
 
         # Set the new since to the timestamp of the last data point + interval
-        since = int(df.iloc[-1]['timestamp']) + exchange.parse_timeframe(timeframe) * 1000
+        since = int(ohlcv[-1][0]) + interval_milliseconds
 
         # Sleep to avoid hitting the API rate limit (if necessary)
-        time.sleep(exchange.rateLimit / 1000)
+        with instrumentation.timed('rate_limit_wait'):
+            time.sleep(exchange.rateLimit / 1000)
+
+    return all_data
 
-    # Concatenate all the DataFrames in the all_data list
-    historical_data = pd.concat(all_data, ignore_index=True)
+def fetch_historical_data(exchange, symbol, timeframe, start_date, end_date, store=None):
+    since = date_to_milliseconds(start_date)
+    end_time_milliseconds = date_to_milliseconds(end_date)
+
+    if store is not None:
+        # Serve cached ranges from the store and only download the missing edges and holes
+        exchange_id = getattr(exchange, 'id', type(exchange).__name__)
+        interval_milliseconds = exchange.parse_timeframe(timeframe) * 1000
+        # Never mark the still-open candle as covered, so it gets refetched once it closes
+        open_candle_start = int(time.time() * 1000) // interval_milliseconds * interval_milliseconds
+        for missing_start, missing_end in store.missing_ranges(exchange_id, symbol, timeframe, since, end_time_milliseconds):
+            ohlcv = fetch_ohlcv_range(exchange, symbol, timeframe, missing_start, missing_end)
+            store.write(exchange_id, symbol, timeframe, ohlcv, missing_start, min(missing_end, open_candle_start))
+        return store.load(exchange_id, symbol, timeframe, since, end_time_milliseconds)
+
+    ohlcv = fetch_ohlcv_range(exchange, symbol, timeframe, since, end_time_milliseconds)
+
+    # Convert the data to a pandas DataFrame
+    historical_data = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
 
     # Convert the timestamp column to datetime objects
     historical_data['timestamp'] = pd.to_datetime(historical_data['timestamp'], unit='ms')
@@ -62,7 +90,9 @@ def execute_trade(exchange, symbol, side, amount, price):
     order = exchange.create_order(symbol, order_type, side, amount, price, params)
     return order
 
-def backtest(strategy, data, taker_fee, initial_balance=1000):
+@instrumented('backtest')
+def backtest(strategy, data, taker_fee, initial_balance=1000, trade_history_file=None):
+    # Pass trade_history_file to also write the trades to a CSV
     balance = initial_balance
     position = 0
     trade_history = []
@@ -118,8 +148,245 @@ def backtest(strategy, data, taker_fee, initial_balance=1000):
     trade_report['performance'] = performance_percentage
     trade_report['just-hold-performance'] = calculate_hold_performance(data)
 
-    df = pd.DataFrame(trade_history) 
-    df.to_csv('trade_history.csv')
+    if trade_history_file:
+        df = pd.DataFrame(trade_history)
+        df.to_csv(trade_history_file)
+
+    return trade_report, trade_history
+
+def timestamps_ms(timestamps):
+    # Epoch milliseconds from a datetime or millisecond timestamp column
+    timestamps = np.asarray(timestamps)
+    if np.issubdtype(timestamps.dtype, np.datetime64):
+        return timestamps.astype('datetime64[ms]').astype(np.int64)
+    return timestamps.astype(np.int64)
+
+def intrabar_levels(data, sub_data, timeframe):
+    # Lower-timeframe view for backtest_arrays(intrabar=...): the opens, highs and lows of sub_data (e.g. cached 1m
+    # candles) and, for every bar of data, the [start, end) range of its sub-bars, found once with searchsorted.
+    bar_ms = convert_time_seconds(timeframe) * 1000
+    timestamps = timestamps_ms(data['timestamp'])
+    sub_timestamps = timestamps_ms(sub_data['timestamp'])
+    starts = np.searchsorted(sub_timestamps, timestamps, side='left')
+    ends = np.searchsorted(sub_timestamps, timestamps + bar_ms, side='left')
+    return (sub_data['open'].to_numpy(dtype=np.float64), sub_data['high'].to_numpy(dtype=np.float64),
+            sub_data['low'].to_numpy(dtype=np.float64), starts, ends)
+
+def _resolve_intrabar(intrabar, i, stop_loss, take_profit, sell_reason, price):
+    # Replay the sub-bars of bar i to see which level was reached first, the stop wins when one sub-bar touches both
+    # unless it opened past the target. A sub-bar that opens past a level fills at its open, the gap is not skipped.
+    # Bars without cached sub-bars keep the bar-level result.
+    sub_open, sub_high, sub_low, starts, ends = intrabar
+    start, end = starts[i], ends[i]
+    hits = np.flatnonzero((sub_low[start:end] <= stop_loss) | (sub_high[start:end] >= take_profit))
+    instrumentation.count('intrabar_drilldowns')
+    if len(hits) == 0:
+        return sell_reason, price
+    hit = start + hits[0]
+    if sub_open[hit] >= take_profit:
+        return 'take_profit', float(sub_open[hit])
+    if sub_low[hit] <= stop_loss:
+        return 'stop_loss', min(stop_loss, float(sub_open[hit]))
+    return 'take_profit', take_profit
+
+@instrumented('backtest')
+def backtest_arrays(close, high, low, signal, stop_loss, take_profit, taker_fee, initial_balance=1000, intrabar=None):
+    # Same rules as backtest() on plain arrays: stop-loss, then take-profit, then sell signal.
+    # Trades are returned as (action, bar index, price, reason) so callers can map the index back to timestamps.
+    # Stop levels may be float32 (see strategies.Signals); prices are walked as Python floats one block at a time
+    # so long histories never get converted to lists all at once.
+    # With intrabar (see intrabar_levels) only the bars touching the stop or target are replayed on the lower
+    # timeframe, which decides the exit and fills it at the stop or target price (or the gapping sub-bar's open)
+    # instead of the close.
+    close = np.asarray(close, dtype=np.float64)
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    signal = np.asarray(signal)
+
+    # While flat only buy signals matter, so jump straight from one buy to the next
+    buy_indices = np.flatnonzero(signal == 1)
+
+    balance = initial_balance
+    position = 0
+    total_fees = 0
+    trades = []
+    current_stop_loss = 0
+    current_take_profit = 0
+    n = len(close)
+    i = 0
+    block_start = block_end = 0
+
+    while i < n:
+        if position <= 0:
+            next_buy = np.searchsorted(buy_indices, i)
+            if next_buy == len(buy_indices):
+                break
+            i = int(buy_indices[next_buy])
+
+        if not block_start <= i < block_end:
+            block_start, block_end = i, min(i + BACKTEST_BLOCK_SIZE, n)
+            close_block = close[block_start:block_end].tolist()
+            high_block = high[block_start:block_end].tolist()
+            low_block = low[block_start:block_end].tolist()
+            signal_block = signal[block_start:block_end].tolist()
+        j = i - block_start
+
+        price = close_block[j]
+
+        if signal_block[j] == 1:  # Buy
+            trade_cost = balance / price
+            fees = trade_cost * taker_fee
+            position = (balance - fees) / price
+            balance = 0
+            trades.append(('buy', i, price, None))
+            total_fees += fees
+            current_stop_loss = float(stop_loss[i])
+            current_take_profit = float(take_profit[i])
+
+        else:
+            sell_reason = None
+
+            if low_block[j] <= current_stop_loss:
+                sell_reason = 'stop_loss'
+            elif high_block[j] >= current_take_profit:
+                sell_reason = 'take_profit'
+            elif signal_block[j] == -1:
+                sell_reason = 'sell_signal'
+
+            if intrabar is not None and sell_reason in ('stop_loss', 'take_profit'):
+                sell_reason, price = _resolve_intrabar(intrabar, i, current_stop_loss, current_take_profit, sell_reason, price)
+
+            if sell_reason:
+                trade_value = position * price
+                fees = trade_value * taker_fee
+                balance = trade_value - fees
+                position = 0
+                trades.append(('sell', i, price, sell_reason))
+                total_fees += fees
+                current_stop_loss = 0
+                current_take_profit = 0
+
+        i += 1
+
+    if position > 0:
+        balance = position * float(close[-1])
+
+    return balance, total_fees, trades
+
+@instrumented('backtest')
+def first_touch(high, low, starts, stop_loss, take_profit):
+    # First bar at or after starts[k] whose low reaches stop_loss[k] or whose high reaches take_profit[k],
+    # len(high) where none does. Descends sparse tables of range minima/maxima, one vectorized step per power of two.
+    n = len(high)
+    lows, highs = [low], [high]
+    while 2 ** len(lows) <= n:
+        half = 2 ** (len(lows) - 1)
+        lows.append(np.minimum(lows[-1][:-half], lows[-1][half:]))
+        highs.append(np.maximum(highs[-1][:-half], highs[-1][half:]))
+
+    position = np.asarray(starts, dtype=np.int64).copy()
+    for level in range(len(lows) - 1, -1, -1):
+        width = 2 ** level
+        fits = position + width <= n
+        index = np.where(fits, position, 0)
+        clear = fits & (lows[level][index] > stop_loss) & (highs[level][index] < take_profit)
+        position[clear] += width
+    return position
+
+def backtest_batch(close, high, low, signals, stop_loss_pct, take_profit_pct, taker_fee, initial_balance=1000):
+    # backtest_arrays() for every column of an (n_bars x n_params) signal matrix at once.
+    # Stops are set at each buy as close * stop_loss_pct[column] and close * take_profit_pct[column].
+    # Returns the final balance and total fees of every column.
+    close = np.asarray(close, dtype=np.float64)
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    stop_loss_pct = np.asarray(stop_loss_pct, dtype=np.float64)
+    take_profit_pct = np.asarray(take_profit_pct, dtype=np.float64)
+    n, n_params = signals.shape
+
+    balance = np.full(n_params, float(initial_balance))
+    total_fees = np.zeros(n_params)
+
+    # Every signal event ordered by column then bar, so the event after a buy is that column's next signal
+    event_columns, event_bars = np.nonzero(signals.T)
+    event_signals = signals[event_bars, event_columns]
+    next_signal = np.append(event_bars[1:], n)
+    next_signal[np.append(event_columns[1:] != event_columns[:-1], True)] = n
+
+    buy = event_signals == 1
+    buy_bars, buy_columns, next_signal = event_bars[buy], event_columns[buy], next_signal[buy]
+    entry_price = close[buy_bars]
+    # A position opened at a buy is closed by the first stop-loss/take-profit touch or the column's next signal:
+    # a sell, or a buy, which (as in backtest_arrays) spends the empty balance and wipes the position
+    exits = np.minimum(first_touch(high, low, buy_bars + 1, entry_price * stop_loss_pct[buy_columns],
+                                   entry_price * take_profit_pct[buy_columns]), next_signal)
+    # Buys sorted by (column, bar) so the next entry after an exit is one searchsorted away
+    buy_keys = buy_columns.astype(np.int64) * (n + 1) + buy_bars
+
+    # Walk the trades of all columns together, one step per round trip instead of one per bar
+    columns = np.unique(buy_columns)
+    current = np.searchsorted(buy_keys, columns * (n + 1))
+    while len(columns):
+        price = entry_price[current]
+        fees = balance[columns] / price * taker_fee
+        position = (balance[columns] - fees) / price
+        total_fees[columns] += fees
+        balance[columns] = 0
+
+        exit_bars = exits[current]
+        open_at_end = exit_bars == n
+        balance[columns[open_at_end]] = position[open_at_end] * close[-1]
+        sold = ~open_at_end
+        sold[sold] = signals[exit_bars[sold], columns[sold]] != 1
+
+        trade_value = position[sold] * close[exit_bars[sold]]
+        fees = trade_value * taker_fee
+        balance[columns[sold]] = trade_value - fees
+        total_fees[columns[sold]] += fees
+
+        columns, exit_bars = columns[sold], exit_bars[sold]
+        current = np.searchsorted(buy_keys, columns * (n + 1) + exit_bars, side='right')
+        reentered = current < len(buy_keys)
+        reentered[reentered] = buy_columns[current[reentered]] == columns[reentered]
+        columns, current = columns[reentered], current[reentered]
+
+    return balance, total_fees
+
+def fast_backtest(strategy, data, taker_fee, initial_balance=1000, trade_history_file=None, signals=None, intrabar=None):
+    # Drop-in replacement for backtest() built on backtest_arrays(), pass trade_history_file to also write the CSV.
+    # With signals (a strategies.Signals) data only needs the OHLCV columns and is left untouched.
+    # intrabar (see intrabar_levels) resolves stop-loss/take-profit exits on lower-timeframe candles.
+    trade_report = {
+        "strategy-name": strategy,
+        "balance": 0,
+        "performance": 0,
+        "just-hold-performance": 0,
+        "total_fees": 0
+    }
+
+    if signals is None:
+        signal, stop_loss, take_profit = data['signal'].to_numpy(), data['stop_loss'].to_numpy(), data['take_profit'].to_numpy()
+    else:
+        signal, stop_loss, take_profit = signals.signal, signals.stop_loss, signals.take_profit
+
+    balance, total_fees, trades = backtest_arrays(
+        data['close'].to_numpy(), data['high'].to_numpy(), data['low'].to_numpy(), signal, stop_loss, take_profit,
+        taker_fee, initial_balance, intrabar)
+
+    timestamps = data['timestamp'].iloc[[index for _, index, _, _ in trades]].tolist()
+    trade_history = [(action, timestamp, price, reason) for (action, _, price, reason), timestamp in zip(trades, timestamps)]
+
+    trade_report['balance'] = balance
+    trade_report['total_fees'] = total_fees
+
+    performance_ratio = balance / initial_balance
+    performance_percentage = (performance_ratio - 1) * 100
+    trade_report['performance'] = performance_percentage
+    trade_report['just-hold-performance'] = calculate_hold_performance(data)
+
+    if trade_history_file:
+        df = pd.DataFrame(trade_history)
+        df.to_csv(trade_history_file)
 
     return trade_report, trade_history
 
@@ -128,21 +395,21 @@ def ichimoku_cloud(data, conversion_line_period=9, base_line_period=26, lagging_
     low_prices = data['low']
 
     # Tenkan-sen (Conversion Line)
-    conversion_line_high = high_prices.rolling(window=conversion_line_period).max()
-    conversion_line_low = low_prices.rolling(window=conversion_line_period).min()
+    conversion_line_high = indicators.rolling_max(high_prices, conversion_line_period)
+    conversion_line_low = indicators.rolling_min(low_prices, conversion_line_period)
     conversion_line = (conversion_line_high + conversion_line_low) / 2
 
     # Kijun-sen (Base Line)
-    base_line_high = high_prices.rolling(window=base_line_period).max()
-    base_line_low = low_prices.rolling(window=base_line_period).min()
+    base_line_high = indicators.rolling_max(high_prices, base_line_period)
+    base_line_low = indicators.rolling_min(low_prices, base_line_period)
     base_line = (base_line_high + base_line_low) / 2
 
     # Senkou Span A (Leading Span A)
     leading_span_a = ((conversion_line + base_line) / 2).shift(displacement)
 
     # Senkou Span B (Leading Span B)
-    leading_span_b_high = high_prices.rolling(window=lagging_span2_period).max()
-    leading_span_b_low = low_prices.rolling(window=lagging_span2_period).min()
+    leading_span_b_high = indicators.rolling_max(high_prices, lagging_span2_period)
+    leading_span_b_low = indicators.rolling_min(low_prices, lagging_span2_period)
     leading_span_b = ((leading_span_b_high + leading_span_b_low) / 2).shift(displacement)
 
     # Chikou Span (Lagging Span)
@@ -151,37 +418,57 @@ def ichimoku_cloud(data, conversion_line_period=9, base_line_period=26, lagging_
     return conversion_line, base_line, leading_span_a, leading_span_b, lagging_span
 
 
-def run_trading_bot(symbol, strategy, interval, short_window=20, long_window=50, update_interval=60):
-    while True:
-        # Fetch the latest historical data
-        start_time = f"{long_window + 1} {interval} ago UTC"
-        historical_data = fetch_historical_data(symbol, interval, start_time)
-        
-        # Generate signals
-        signal_data = strategy.generate_signals(historical_data, short_window, long_window)
+def run_trading_bot(exchange, symbol, strategy, interval, update_interval=60):
+    interval_milliseconds = exchange.parse_timeframe(interval) * 1000
+    if '/' in symbol:
+        base_currency, quote_currency = symbol.split('/')
+    else:
+        base_currency, quote_currency = symbol[:3], symbol[3:]
 
-        # Check the latest signal
-        latest_signal = signal_data.iloc[-1]['signal']
+    # Warm the strategy's incremental state up once with just enough closed bars
+    now = int(time.time() * 1000)
+    last_closed = now // interval_milliseconds * interval_milliseconds - interval_milliseconds
+    since = last_closed - (strategy.warmup_period - 1) * interval_milliseconds
+    strategy.reset()
+    last_timestamp = since - interval_milliseconds
+    for row in fetch_ohlcv_range(exchange, symbol, interval, since, last_closed + interval_milliseconds):
+        strategy.update(dict(zip(['timestamp', 'open', 'high', 'low', 'close', 'volume'], row)))
+        last_timestamp = int(row[0])
+
+    while True:
+        # Wait for the specified update interval before fetching new data
+        with instrumentation.timed('live_sleep'):
+            time.sleep(update_interval)
+
+        # Only pull candles newer than the last one seen and keep the closed ones
+        now = int(time.time() * 1000)
+        with instrumentation.timed('live_fetch'):
+            candles = exchange.fetch_ohlcv(symbol, interval, last_timestamp + interval_milliseconds)
+        decision_start = time.perf_counter()
+        closed = [row for row in candles if row[0] + interval_milliseconds <= now]
+        if not closed:
+            continue
+
+        for row in closed:
+            latest_signal = strategy.update(dict(zip(['timestamp', 'open', 'high', 'low', 'close', 'volume'], row)))
+            last_timestamp = int(row[0])
+        price = closed[-1][4]
+        instrumentation.observe('live_decision_seconds', time.perf_counter() - decision_start)
 
         if latest_signal == 1:  # Buy
             print("Buy signal detected")
             # Check if you have enough balance to buy
-            wallet_balance = fetch_balance()
-            base_currency, quote_currency = symbol[:3], symbol[3:]
-            quote_currency_balance = float(wallet_balance[quote_currency]['free'])
+            wallet_balance = fetch_balance(exchange)
+            quote_currency_balance = float(wallet_balance.get(quote_currency, 0))
             if quote_currency_balance > 0:
-                execute_trade(symbol, 'buy', quote_currency_balance)
+                execute_trade(exchange, symbol, 'buy', quote_currency_balance / price, price)
                 print("Executed buy order")
 
         elif latest_signal == -1:  # Sell
             print("Sell signal detected")
             # Check if you have enough balance to sell
-            wallet_balance = fetch_balance()
-            base_currency, quote_currency = symbol[:3], symbol[3:]
-            base_currency_balance = float(wallet_balance[base_currency]['free'])
+            wallet_balance = fetch_balance(exchange)
+            base_currency_balance = float(wallet_balance.get(base_currency, 0))
             if base_currency_balance > 0:
-                execute_trade(symbol, 'sell', base_currency_balance)
+                execute_trade(exchange, symbol, 'sell', base_currency_balance, price)
                 print("Executed sell order")
-
-        # Wait for the specified update interval before fetching new data
-        time.sleep(update_interval)
@@ -0,0 +1,170 @@
+import os
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+from trading import backtest_arrays, backtest_batch
+import indicators
+from optimization import STRATEGY_CLASSES, build_strategy, define_search_space
+from strategies import signal_matrix
+
+# Per-process views of the shared feature arrays, set up once by _init_worker
+_worker_shms = []
+_worker_arrays = None
+
+# Largest n_bars x n_candidates signal matrix compute_features builds, 1 GiB of int8
+MAX_SIGNAL_CELLS = 1 << 30
+
+def fold_windows(n_bars, train_size, test_size, anchored=False):
+    # (train_start, train_end, test_start, test_end) bar ranges; anchored folds always train from bar 0
+    folds = []
+    train_start = 0
+    while True:
+        train_end = train_start + train_size if not anchored else train_size + len(folds) * test_size
+        test_end = min(train_end + test_size, n_bars)
+        if train_end >= n_bars:
+            break
+        folds.append((0 if anchored else train_start, train_end, train_end, test_end))
+        train_start += test_size
+    return folds
+
+def compute_features(strategy_class, historical_data, candidates, sl_tp_params=None):
+    # Signals of every candidate over the full history, computed once and sliced per fold
+    close = historical_data['close'].to_numpy(dtype=np.float64)
+    features = {
+        'close': close,
+        'high': historical_data['high'].to_numpy(dtype=np.float64),
+        'low': historical_data['low'].to_numpy(dtype=np.float64),
+    }
+    if len(close) * len(candidates) > MAX_SIGNAL_CELLS:
+        raise ValueError(f"{len(candidates)} candidates on {len(close)} bars exceed the {MAX_SIGNAL_CELLS} cell signal matrix, "
+                         "pass a sample of the grid as candidates (e.g. search.sample_candidates).")
+    strategies = [build_strategy(strategy_class, params, sl_tp_params) for params in candidates]
+
+    if strategy_class in STRATEGY_CLASSES:
+        signals, stop_loss_pct, take_profit_pct = STRATEGY_CLASSES[strategy_class].generate_signal_matrix(
+            historical_data, [strategy.params for strategy in strategies])
+    else:
+        # Stops are close * multiplier on buy bars for every strategy, so only the multipliers are kept per column
+        signals = signal_matrix(len(close), len(candidates))
+        with indicators.pinned(historical_data):
+            for column, strategy in enumerate(strategies):
+                signals[:, column] = strategy.compute_signals(historical_data, dtype=np.float64).signal
+        stop_loss_pct, take_profit_pct = np.array([strategy.level_multipliers() for strategy in strategies], dtype=np.float64).T
+    features.update(signals=signals, stop_loss_pct=stop_loss_pct, take_profit_pct=take_profit_pct)
+    return features
+
+def _column_levels(features, column):
+    buys = features['signals'][:, column] == 1
+    close = features['close']
+    return (np.where(buys, close * features['stop_loss_pct'][column], 0.0),
+            np.where(buys, close * features['take_profit_pct'][column], 0.0))
+
+def equity_curve(close, trades, taker_fee, initial_balance):
+    # Mark-to-market balance on every bar, replaying backtest_arrays' trades with the same fee math
+    equity = np.empty(len(close))
+    balance = initial_balance
+    position = 0
+    previous = 0
+    for action, index, price, _ in trades:
+        equity[previous:index] = position * close[previous:index] if position > 0 else balance
+        if action == 'buy':
+            fees = balance / price * taker_fee
+            position = (balance - fees) / price
+            balance = 0
+        else:
+            trade_value = position * price
+            balance = trade_value - trade_value * taker_fee
+            position = 0
+        previous = index
+    equity[previous:] = position * close[previous:] if position > 0 else balance
+    return equity
+
+def run_fold(features, fold, taker_fee):
+    # Pick the best candidate on the train window and backtest it on the test window, both with a unit balance
+    train_start, train_end, test_start, test_end = fold
+    train = slice(train_start, train_end)
+    signals = features['signals']
+
+    train_balances, _ = backtest_batch(features['close'][train], features['high'][train], features['low'][train],
+                                       signals[train], features['stop_loss_pct'], features['take_profit_pct'], taker_fee, 1)
+    # np.argmax keeps the first best column, the grid's first-best-wins rule
+    best = int(np.argmax(np.where(np.isnan(train_balances), -np.inf, train_balances)))
+
+    test = slice(test_start, test_end)
+    stop_loss, take_profit = _column_levels(features, best)
+    close = features['close'][test]
+    balance, _, trades = backtest_arrays(close, features['high'][test], features['low'][test], signals[test, best],
+                                         stop_loss[test], take_profit[test], taker_fee, initial_balance=1)
+    return best, float(train_balances[best]), balance, len(trades), equity_curve(close, trades, taker_fee, 1)
+
+def _init_worker(specs):
+    global _worker_shms, _worker_arrays
+    _worker_arrays = {}
+    for key, (name, shape, dtype) in specs.items():
+        shm = shared_memory.SharedMemory(name=name)
+        _worker_shms.append(shm)
+        _worker_arrays[key] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+def _run_fold_worker(fold, taker_fee):
+    return run_fold(_worker_arrays, fold, taker_fee)
+
+def walk_forward_optimize(strategy_class, historical_data, taker_fee, train_size, test_size, sl_tp_params=None,
+                          anchored=False, candidates=None, n_jobs=None, initial_balance=1000):
+    # Optimize on each train window, trade the winner on the following test window and chain the
+    # out-of-sample results. Returns a per-fold DataFrame and the stitched out-of-sample equity Series.
+    if candidates is None:
+        candidates = list(itertools.product(*define_search_space(strategy_class)))
+    folds = fold_windows(len(historical_data), train_size, test_size, anchored)
+    if not folds:
+        raise ValueError("Not enough data for a single train/test fold.")
+    features = compute_features(strategy_class, historical_data, candidates, sl_tp_params)
+
+    if n_jobs is None:
+        n_jobs = os.cpu_count()
+
+    if n_jobs > 1 and len(folds) > 1:
+        shms = []
+        specs = {}
+        try:
+            for key, array in features.items():
+                shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+                shms.append(shm)
+                np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[:] = array
+                specs[key] = (shm.name, array.shape, array.dtype)
+            with ProcessPoolExecutor(max_workers=min(n_jobs, len(folds)), initializer=_init_worker, initargs=(specs,)) as executor:
+                results = list(executor.map(_run_fold_worker, folds, itertools.repeat(taker_fee)))
+        finally:
+            for shm in shms:
+                shm.close()
+                shm.unlink()
+    else:
+        results = [run_fold(features, fold, taker_fee) for fold in folds]
+
+    # Each fold ran on a unit balance; the backtest is linear in its starting balance, so chain them
+    balance = initial_balance
+    rows = []
+    equity = []
+    for (train_start, train_end, test_start, test_end), (best, train_balance, test_balance, trades, fold_equity) in zip(folds, results):
+        equity.append(fold_equity * balance)
+        rows.append({
+            "train_start": historical_data['timestamp'].iloc[train_start],
+            "train_end": historical_data['timestamp'].iloc[train_end - 1],
+            "test_start": historical_data['timestamp'].iloc[test_start],
+            "test_end": historical_data['timestamp'].iloc[test_end - 1],
+            "params": candidates[best],
+            "train_performance": (train_balance - 1) * 100,
+            "test_performance": (test_balance - 1) * 100,
+            "trades": trades,
+        })
+        balance *= test_balance
+
+    out_of_sample = slice(folds[0][2], folds[-1][3])
+    equity = pd.Series(np.concatenate(equity), index=historical_data['timestamp'].iloc[out_of_sample], name='equity')
+
+    print("Folds:", len(folds))
+    print("Out-of-sample balance (USD):", balance)
+    print("Out-of-sample performance (%):", (balance / initial_balance - 1) * 100)
+
+    return pd.DataFrame(rows), equity